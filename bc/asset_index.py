@@ -0,0 +1,140 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app_types import AssetFieldSpec, AssetSpec
+
+Key = Tuple[Any, ...]
+
+_MISSING = object()
+
+
+def field_name(field: str | AssetFieldSpec) -> str:
+    if isinstance(field, dict):
+        return str(field["name"])
+    return field
+
+
+def get_field(asset: Dict[str, Any], path: str) -> Any:
+    """
+    Return the value of `path` in `asset`. A flat key of that name wins;
+    otherwise dotted paths ("attributes.vatCode") are resolved through nested
+    objects. The previous flat `asset.get(path)` never found nested values,
+    so a predicate on such a field (Organization's attributes.vatCode) only
+    matched assets without it, and only when its value was None.
+    """
+    if path in asset:
+        return asset[path]
+    current: Any = asset
+    for part in path.split("."):
+        if not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _hashable(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return value
+
+
+class CompositeKeyIndex:
+    """
+    Hash index of assets by the tuple of values of `fields`.
+
+    Replaces a linear scan per predicate with a dict lookup; build it once per
+    asset type with `build` (any iterable works, e.g. a streamed find_all) and
+    query it with predicates of the form {field: value}.
+    """
+
+    def __init__(self, fields: Sequence[str | AssetFieldSpec]) -> None:
+        if not fields:
+            raise ValueError("CompositeKeyIndex needs at least one field")
+        self.fields: Tuple[str, ...] = tuple(field_name(f) for f in fields)
+        self._entries: Dict[Key, List[Dict[str, Any]]] = {}
+        self._size = 0
+
+    @classmethod
+    def from_spec(cls, asset_spec: AssetSpec) -> "CompositeKeyIndex":
+        return cls(asset_spec.predicate_fields)
+
+    @classmethod
+    def build(
+        cls,
+        fields: Sequence[str | AssetFieldSpec],
+        assets: Iterable[Dict[str, Any]],
+    ) -> "CompositeKeyIndex":
+        index = cls(fields)
+        index.add_all(assets)
+        return index
+
+    def _key(self, values: Dict[str, Any]) -> Key:
+        key = []
+        for f in self.fields:
+            value = get_field(values, f)
+            # a missing field matches None, as asset.get(field) == value did
+            key.append(None if value is _MISSING else _hashable(value))
+        return tuple(key)
+
+    def add(self, asset: Dict[str, Any]) -> None:
+        key = self._key(asset)
+        self._entries.setdefault(key, []).append(asset)
+        self._size += 1
+
+    def add_all(self, assets: Iterable[Dict[str, Any]]) -> None:
+        for asset in assets:
+            self.add(asset)
+
+    def get_all(self, predicate: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Return every indexed asset matching `predicate` (in insertion order)."""
+        if set(predicate.keys()) != set(self.fields):
+            raise ValueError(
+                f"Predicate fields {sorted(predicate.keys())} do not match index fields {sorted(self.fields)}"
+            )
+        return self._entries.get(self._key(predicate), [])
+
+    def get(self, predicate: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the first indexed asset matching `predicate`, if any."""
+        matches = self.get_all(predicate)
+        return matches[0] if matches else None
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class AssetMatcher:
+    """
+    Resolves predicates against one asset list, building (and reusing) one
+    CompositeKeyIndex per distinct set of predicate fields.
+    """
+
+    def __init__(
+        self,
+        assets: Iterable[Dict[str, Any]],
+        asset_spec: Optional[AssetSpec] = None,
+    ) -> None:
+        self._indexes: Dict[Tuple[str, ...], CompositeKeyIndex] = {}
+        if asset_spec is None:
+            self._assets = list(assets)
+            return
+        # index by the spec's predicate fields while consuming the stream
+        spec_index = CompositeKeyIndex.from_spec(asset_spec)
+        self._assets = []
+        for asset in assets:
+            self._assets.append(asset)
+            spec_index.add(asset)
+        self._indexes[tuple(sorted(spec_index.fields))] = spec_index
+
+    def __len__(self) -> int:
+        return len(self._assets)
+
+    def index_for(self, fields: Iterable[str]) -> CompositeKeyIndex:
+        key = tuple(sorted(fields))
+        if key not in self._indexes:
+            self._indexes[key] = CompositeKeyIndex.build(key, self._assets)
+        return self._indexes[key]
+
+    def find(self, predicate: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not predicate:
+            return None
+        return self.index_for(predicate.keys()).get(predicate)
@@ -1,11 +1,15 @@
 import os
+import threading
+import time
 import requests
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Dict, Protocol
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol, Tuple
 from pydantic import BaseModel
+from pymongo import MongoClient
 
-from app_types import AssetType, Environment
+from app_types import AssetType, Environment, Operation
 from http_utils import retry_call
 from logger import get_logger
 
@@ -20,6 +24,21 @@ except Exception:
 
 logger = get_logger(__name__)
 
+CACHE_RELOAD_CONCURRENCY = int(os.getenv("CACHE_RELOAD_CONCURRENCY", "8"))
+CACHE_RELOAD_TIMEOUT = 120
+CACHE_FRESH_DEADLINE = float(os.getenv("CACHE_FRESH_DEADLINE", "300"))
+CACHE_POLL_INTERVAL = 5.0
+
+# (org, host) -> True once the org's ultra-cache reflects the refresh,
+# None when the org cannot be checked (e.g. its cache never held the asset)
+CacheProbe = Callable[[str, str], Optional[bool]]
+
+# fields that change on every write of an asset, compared by the sentinel probe
+VERSION_FIELDS = ("updatedAt", "version")
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
 
 class ReloadCacheParams(BaseModel):
     env: Environment
@@ -28,6 +47,115 @@ class ReloadCacheParams(BaseModel):
     exclude: Optional[List[AssetType]] = None
 
 
+class OrgReloadResult(BaseModel):
+    org: str
+    host: str
+    ok: bool
+    status_code: Optional[int] = None
+    latency_s: float
+    error: Optional[str] = None
+    # set only when waiting for completion: None = not checked
+    fresh: Optional[bool] = None
+    fresh_after_s: Optional[float] = None
+
+
+class ReloadCacheReport(BaseModel):
+    env: Environment
+    results: List[OrgReloadResult]
+    elapsed_s: float
+
+    @property
+    def ok(self) -> bool:
+        return all(r.ok for r in self.results)
+
+    @property
+    def failed(self) -> List[OrgReloadResult]:
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def stale(self) -> List[OrgReloadResult]:
+        return [r for r in self.results if r.fresh is False]
+
+
+def _fingerprint(doc: Dict[str, Any]) -> Tuple[Any, ...]:
+    return tuple(doc.get(f) for f in VERSION_FIELDS)
+
+
+def sentinel_probe(
+    client: MongoClient,
+    asset_type: AssetType,
+    predicate: Dict[str, Any],
+    operation: Operation,
+    orgs: Optional[Iterable[str]] = None,
+) -> CacheProbe:
+    """
+    Stand-in for a refresh status endpoint. Build it before the asset is
+    written, so the baselines show the old version.
+
+    Reads the asset matching `predicate` from the cached collection of every
+    org database that has one (all of them, or only `orgs`) and remembers
+    its VERSION_FIELDS. After the reload an org is fresh when:
+    - create: the asset is there (with new version fields if it already was)
+    - update: its version fields changed
+    - delete: it is gone
+    Orgs without the collection, whose cache did not hold the asset before
+    an update/delete, or whose cached asset has no version fields to
+    compare, are not checked (the probe returns None).
+    """
+    collection = f"cached_{asset_type}"
+    projection = {f: 1 for f in VERSION_FIELDS}
+    wanted = None if orgs is None else set(orgs)
+
+    before: Dict[str, Optional[Tuple[Any, ...]]] = {}
+    for db_name in client.list_database_names():
+        if wanted is not None and db_name not in wanted:
+            continue
+        if not client[db_name].list_collection_names(filter={"name": collection}):
+            continue
+        doc = client[db_name][collection].find_one(predicate, projection)
+        before[db_name] = None if doc is None else _fingerprint(doc)
+    logger.info(
+        "Cache sentinel %s %s %s checks %d orgs",
+        operation,
+        asset_type,
+        predicate,
+        len(before),
+    )
+
+    def probe(org: str, host: str) -> Optional[bool]:
+        if org not in before:
+            return None
+        prev = before[org]
+        if prev is None:
+            if operation != "create":
+                return None
+        elif operation != "delete" and all(v is None for v in prev):
+            # nothing to tell the old and the new version apart by
+            return None
+        doc = client[org][collection].find_one(predicate, projection)
+        if operation == "delete":
+            return doc is None
+        if doc is None:
+            return False
+        return prev is None or _fingerprint(doc) != prev
+
+    return probe
+
+
+def _session(host: str) -> requests.Session:
+    """One keep-alive session per host, reused by later reloads."""
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            _sessions[host] = session
+        return session
+
+
+def _org_host(org: str, env: Environment) -> str:
+    return f"https://{org}{'' if env == 'prod' else '.' + env}.cp-bc.com"
+
+
 def _resolve_secrets_path() -> Path:
     """
     Determine the secrets.yaml path from environment.
@@ -74,9 +202,112 @@ def _validate_orgs(
             )
 
 
-def _reload_cache(
-    params: ReloadCacheParams, secrets: Dict[str, Dict[str, str]]
+def _wait_fresh(
+    result: OrgReloadResult,
+    probe: CacheProbe,
+    deadline: float,
+    poll_interval: float,
 ) -> None:
+    start = time.monotonic()
+    while True:
+        try:
+            fresh = probe(result.org, result.host)
+            if fresh is None:
+                logger.debug("Ultra-cache of org=%s not checked", result.org)
+                return
+            if fresh:
+                result.fresh = True
+                result.fresh_after_s = time.monotonic() - start
+                logger.info(
+                    "Ultra-cache of org=%s fresh after %.1fs",
+                    result.org,
+                    result.fresh_after_s,
+                )
+                return
+        except Exception as e:
+            logger.warning("Cache probe failed for org=%s: %s", result.org, e)
+        if time.monotonic() + poll_interval > deadline:
+            result.fresh = False
+            logger.warning(
+                "Ultra-cache of org=%s still stale at the deadline", result.org
+            )
+            return
+        time.sleep(poll_interval)
+
+
+def _reload_org(
+    org: str,
+    params: ReloadCacheParams,
+    secrets: Dict[str, Dict[str, str]],
+    data: Dict[str, Dict[str, List[str]]],
+    probe: Optional[CacheProbe] = None,
+    deadline: float = 0.0,
+) -> OrgReloadResult:
+    host = _org_host(org, params.env)
+    url = f"{host}/api/v1.0/ultra-cache/data/refresh"
+    session = _session(host)
+    start = time.monotonic()
+    try:
+        response = retry_call(
+            lambda: session.post(
+                url,
+                headers={"Surge-Machine-Secret": secrets[org][params.env]},
+                json=data,
+                timeout=CACHE_RELOAD_TIMEOUT,
+            )
+        )
+    except Exception as e:
+        logger.exception(
+            "Error reloading ultra-cache for org=%s (%s): %s", org, host, e
+        )
+        return OrgReloadResult(
+            org=org,
+            host=host,
+            ok=False,
+            latency_s=time.monotonic() - start,
+            error=str(e),
+        )
+
+    latency = time.monotonic() - start
+    if response.status_code == 200:
+        logger.info(
+            "Ultra-cache reload OK for org=%s (%s) in %.1fs", org, host, latency
+        )
+        result = OrgReloadResult(
+            org=org,
+            host=host,
+            ok=True,
+            status_code=response.status_code,
+            latency_s=latency,
+        )
+        if probe is not None:
+            _wait_fresh(result, probe, deadline, CACHE_POLL_INTERVAL)
+        return result
+
+    logger.error(
+        "Ultra-cache reload FAILED for org=%s (%s): status=%s body=%s",
+        org,
+        host,
+        response.status_code,
+        response.text[:500],
+    )
+    return OrgReloadResult(
+        org=org,
+        host=host,
+        ok=False,
+        status_code=response.status_code,
+        latency_s=latency,
+        error=response.text[:500],
+    )
+
+
+def _reload_cache(
+    params: ReloadCacheParams,
+    secrets: Dict[str, Dict[str, str]],
+    max_workers: int = CACHE_RELOAD_CONCURRENCY,
+    probe: Optional[CacheProbe] = None,
+    deadline_s: float = CACHE_FRESH_DEADLINE,
+) -> ReloadCacheReport:
     orgs = params.org if params.org else _get_all_orgs(secrets)
     data: Dict[str, Dict[str, List[str]]] = {"default": {}}
     if params.include:
@@ -92,37 +323,34 @@ def _reload_cache(
         params.exclude,
     )
 
-    for o in orgs:
-        host = (
-            f"https://{o}{'' if params.env == 'prod' else '.' + params.env}.cp-bc.com"
-        )
-        url = f"{host}/api/v1.0/ultra-cache/data/refresh"
-
-        try:
-            response = retry_call(
-                lambda: requests.post(
-                    url,
-                    headers={"Surge-Machine-Secret": secrets[o][params.env]},
-                    json=data,
-                    timeout=120,
+    start = time.monotonic()
+    deadline = start + deadline_s
+    results: List[OrgReloadResult] = []
+    if orgs:
+        # each org is a separate host, so the requests (and the waits for
+        # completion) are independent
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(orgs))),
+            thread_name_prefix="cache-reload",
+        ) as ex:
+            results = list(
+                ex.map(
+                    lambda o: _reload_org(o, params, secrets, data, probe, deadline),
+                    orgs,
                 )
             )
-            if response.status_code == 200:
-                logger.info("Ultra-cache reload OK for org=%s (%s)", o, host)
-            else:
-                logger.error(
-                    "Ultra-cache reload FAILED for org=%s (%s): status=%s body=%s",
-                    o,
-                    host,
-                    response.status_code,
-                    response.text[:500],
-                )
-        except Exception as e:
-            logger.exception(
-                "Error reloading ultra-cache for org=%s (%s): %s", o, host, e
-            )
 
-    logger.info("Ultra-cache reload finished")
+    report = ReloadCacheReport(
+        env=params.env, results=results, elapsed_s=time.monotonic() - start
+    )
+    logger.info(
+        "Ultra-cache reload finished in %.1fs: %d ok, %d failed, %d stale",
+        report.elapsed_s,
+        len(results) - len(report.failed),
+        len(report.failed),
+        len(report.stale),
+    )
+    return report
 
 
 def reload_cache(
@@ -131,7 +359,11 @@ def reload_cache(
     include: Optional[List[AssetType]] = None,
     exclude: Optional[List[AssetType]] = None,
     secrets_path: Optional[Path] = None,  # path now comes from .env by default
-) -> None:
+    max_workers: int = CACHE_RELOAD_CONCURRENCY,
+    wait: bool = False,
+    probe: Optional[CacheProbe] = None,
+    deadline_s: float = CACHE_FRESH_DEADLINE,
+) -> ReloadCacheReport:
     """
     Main entrypoint function for reloading ultra-cache.
 
@@ -140,11 +372,20 @@ def reload_cache(
     :param include: Assets to include (optional)
     :param exclude: Assets to exclude (optional)
     :param secrets_path: Optional explicit path to secrets.yaml; if None, read from .env (SECRETS_PATH)
+    :param max_workers: How many organizations are refreshed concurrently
+    :param wait: Fire-and-forget when False; otherwise poll `probe` per
+                 organization until its cache is fresh or `deadline_s` passes
+    :return: Per-organization status and latency
     """
     params = ReloadCacheParams(
         env=env, org=organizations, include=include, exclude=exclude
     )
+    if wait and probe is None:
+        raise ValueError("Waiting for the cache refresh needs a probe")
     secrets = _load_secrets(secrets_path)
     _validate_orgs(params, secrets)
-    _reload_cache(params, secrets)
+    report = _reload_cache(
+        params, secrets, max_workers, probe if wait else None, deadline_s
+    )
     logger.info("Done")
+    return report
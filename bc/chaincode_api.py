@@ -1,6 +1,6 @@
 import json
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 from logger import get_logger
 
 import requests
@@ -16,6 +16,8 @@ IDS: Dict[str, str] = {
     "Organization": "companyId",
 }
 
+BATCH_CHUNK_SIZE = 200
+
 
 def id_mapper(asset_type: str) -> str:
     return IDS.get(asset_type, "id")
@@ -96,15 +98,29 @@ class BlockchainApi:
     def run_batch(self, batch_payloads: List[dict]) -> Any:
         return self._execute("invoke", "invokeDirectBatch", {"data": batch_payloads})
 
+    def run_batch_chunked(self, batch_payloads: List[dict], chunk_size: int = BATCH_CHUNK_SIZE) -> List[Any]:
+        """Send `batch_payloads` as consecutive invokeDirectBatch calls of at most `chunk_size` items."""
+        results = []
+        for start in range(0, len(batch_payloads), chunk_size):
+            chunk = batch_payloads[start : start + chunk_size]
+            logger.debug(f"Sending batch chunk {start}..{start + len(chunk)} of {len(batch_payloads)}")
+            results.append(self.run_batch(chunk))
+        return results
+
     # ----------------- public api -----------------
 
     def find_all_types(self) -> List[str]:
         res = self._request("POST", f"{self.base_url}/api/v1.0/chaincode/query/findAllTypes", {})
         return (res or {}).get("types", [])
 
-    def find_all(self, type_: str, fields: Optional[List[str]] = None) -> List[dict]:
+    def iter_all(self, type_: str, fields: Optional[List[str]] = None) -> Iterator[dict]:
+        """Like find_all, but decodes the assets one at a time."""
         res = self.run("query", {"operation": "FIND_ALL", "type": f"{self.ns}{type_}", "fields": fields})
-        return [json.loads(x) if isinstance(x, str) else x for x in (res or [])]
+        for x in res or []:
+            yield json.loads(x) if isinstance(x, str) else x
+
+    def find_all(self, type_: str, fields: Optional[List[str]] = None) -> List[dict]:
+        return list(self.iter_all(type_, fields))
 
     def delete_one(self, type_: str, id_: str) -> Any:
         return self.run("invoke", {"operation": "DELETE", "type": f"{self.ns}{type_}", "id": id_})
@@ -123,24 +139,24 @@ class BlockchainApi:
             },
         )
 
-    def save_batch(self, type_: str, batch: Iterable[dict]) -> Any:
-        n = sum(1 for _ in batch)
+    def save_batch(self, type_: str, batch: Iterable[dict], chunk_size: int = BATCH_CHUNK_SIZE) -> Any:
+        batch = list(batch)
         if self.dry_run:
-            logger.info(f"Dry run: save_batch for {type_} with {n} items")
+            logger.info(f"Dry run: save_batch for {type_} with {len(batch)} items")
             return None
         payloads = [
             {"operation": "SAVE", "type": f"{self.ns}{type_}", "id": d.get(id_mapper(type_)), "data": json.dumps(d)}
             for d in batch
         ]
-        return self.run_batch(payloads)
+        return self.run_batch_chunked(payloads, chunk_size)
 
-    def delete_batch(self, type_: str, ids: Iterable[str]) -> Any:
-        n = sum(1 for _ in ids)
+    def delete_batch(self, type_: str, ids: Iterable[str], chunk_size: int = BATCH_CHUNK_SIZE) -> Any:
+        ids = list(ids)
         if self.dry_run:
-            logger.info(f"Dry run: delete_batch for {type_} with {n} items")
+            logger.info(f"Dry run: delete_batch for {type_} with {len(ids)} items")
             return None
         payloads = [{"operation": "DELETE", "type": f"{self.ns}{type_}", "id": id_} for id_ in ids]
-        return self.run_batch(payloads)
+        return self.run_batch_chunked(payloads, chunk_size)
 
     def exists(self, type_: str, id_: str) -> bool:
         res = self.run("query", {"operation": "EXISTS", "type": f"{self.ns}{type_}", "id": id_})
@@ -150,6 +166,14 @@ class BlockchainApi:
         res = self.run("query", {"operation": "FIND", "type": f"{self.ns}{type_}", "id": id_})
         return json.loads(res) if isinstance(res, str) else res
 
+    def find_existing(self, type_: str, ids: Iterable[str]) -> Dict[str, dict]:
+        """Fetch the assets of `ids` that exist, by id, without listing the whole type."""
+        found: Dict[str, dict] = {}
+        for id_ in ids:
+            if self.exists(type_, id_):
+                found[id_] = self.find(type_, id_)
+        return found
+
     def check_if_referred(self, source_type: str, source_id: str) -> List[str]:
         result: List[str] = []
         if self._cached_types is None:
@@ -0,0 +1,115 @@
+import codecs
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from logger import get_logger
+
+# Optional: use the Kubernetes API when the `kubernetes` package is present;
+# otherwise bc.kube_utils sticks to the kubectl subprocess path.
+try:
+    from kubernetes import client as k8s_client, config as k8s_config
+except ImportError:
+    k8s_client = None
+    k8s_config = None
+
+logger = get_logger(__name__)
+
+# "auto" (API when installed, kubectl when not or when an API call fails),
+# "api" (API only, failures are raised) or "kubectl"
+KUBE_BACKENDS = ("auto", "api", "kubectl")
+KUBE_BACKEND = os.getenv("KUBE_BACKEND", "auto").lower()
+
+_apis: Dict[str, Any] = {}
+_apis_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    if KUBE_BACKEND not in KUBE_BACKENDS:
+        raise ValueError(
+            f"KUBE_BACKEND must be one of {KUBE_BACKENDS}, got {KUBE_BACKEND!r}"
+        )
+    if KUBE_BACKEND == "api" and k8s_client is None:
+        raise RuntimeError("KUBE_BACKEND=api needs the 'kubernetes' package.")
+    return k8s_client is not None and KUBE_BACKEND != "kubectl"
+
+
+def is_required() -> bool:
+    """True when API failures must be raised instead of falling back to kubectl."""
+    return KUBE_BACKEND == "api"
+
+
+def core_api(context: str) -> Any:
+    """
+    Return the CoreV1Api for kube `context`, creating it on first use.
+
+    The underlying ApiClient (and its connection pool) is reused for every
+    later call on the same context.
+    """
+    if k8s_client is None or k8s_config is None:
+        raise RuntimeError("The 'kubernetes' package is not installed.")
+    with _apis_lock:
+        api = _apis.get(context)
+        if api is None:
+            logger.debug(f"Creating Kubernetes API client for context {context}")
+            api_client = k8s_config.new_client_from_config(context=context)
+            api = k8s_client.CoreV1Api(api_client=api_client)
+            _apis[context] = api
+        return api
+
+
+def list_pod_names(
+    context: str,
+    namespace: str,
+    *,
+    label_selector: Optional[str] = None,
+    timeout: float = 10,
+) -> List[str]:
+    pods = core_api(context).list_namespaced_pod(
+        namespace,
+        label_selector=label_selector,
+        _request_timeout=timeout,
+    )
+    return [p.metadata.name for p in pods.items]
+
+
+def stream_pod_log(
+    context: str,
+    namespace: str,
+    pod_name: str,
+    *,
+    since_seconds: Optional[int] = None,
+    tail_lines: Optional[int] = None,
+    follow: bool = False,
+    timestamps: bool = False,
+    timeout: Optional[float] = None,
+) -> Iterator[str]:
+    """
+    Yield the pod's log line by line (without trailing newlines) as it is
+    received, without loading the whole log into memory.
+    """
+    kwargs: Dict[str, Any] = {
+        "follow": follow,
+        "timestamps": timestamps,
+        "_preload_content": False,
+    }
+    if since_seconds is not None:
+        kwargs["since_seconds"] = since_seconds
+    if tail_lines is not None:
+        kwargs["tail_lines"] = tail_lines
+    if timeout is not None:
+        kwargs["_request_timeout"] = timeout
+
+    resp = core_api(context).read_namespaced_pod_log(pod_name, namespace, **kwargs)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    try:
+        for chunk in resp.stream(64 * 1024):
+            pending += decoder.decode(chunk)
+            *lines, pending = pending.split("\n")
+            yield from lines
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending
+    finally:
+        resp.release_conn()
@@ -0,0 +1,367 @@
+import heapq
+import math
+import queue
+import re
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app_types import Environment
+from bc import kube_api
+from bc.kube_utils import (
+    KubeError,
+    Namespace,
+    find_pod_names_fuzzy,
+    kubectl_cmd,
+    prepare_context,
+)
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+LOG_LEVELS = ("TRACE", "DEBUG", "INFO", "WARN", "ERROR", "FATAL")
+
+_LEVEL_ALIASES = {"WARNING": "WARN", "CRITICAL": "FATAL", "ERR": "ERROR"}
+_LEVEL_RE = re.compile(
+    r"\b(TRACE|DEBUG|INFO|WARN(?:ING)?|ERR(?:OR)?|FATAL|CRITICAL)\b", re.IGNORECASE
+)
+# RFC3339 prefix added by `--timestamps`, e.g. 2025-09-01T10:00:00.123456789Z
+_TS_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:\d{2}) ")
+
+
+@dataclass(frozen=True)
+class LogLine:
+    timestamp: Optional[datetime]
+    text: str
+    level: Optional[str]
+    namespace: str
+    pod: str
+
+    def __str__(self) -> str:
+        return self.text
+
+    def labeled(self) -> str:
+        return f"[{self.namespace}/{self.pod}] {self.text}"
+
+
+def normalize_level(level: str) -> str:
+    level = level.upper()
+    return _LEVEL_ALIASES.get(level, level)
+
+
+def parse_level(text: str) -> Optional[str]:
+    m = _LEVEL_RE.search(text)
+    return normalize_level(m.group(1)) if m else None
+
+
+def parse_time(value: str) -> datetime:
+    """Parse an ISO/RFC3339 time; naive values are taken as UTC (cluster time)."""
+    ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def _split_timestamp(raw: str) -> tuple[Optional[datetime], str]:
+    m = _TS_RE.match(raw)
+    if m is None:
+        return None, raw
+    base, fraction, tz = m.groups()
+    # datetime supports microseconds only, kubelet emits nanoseconds
+    fraction = (fraction or "")[:7]
+    tz = "+00:00" if tz == "Z" else tz
+    return datetime.fromisoformat(f"{base}{fraction}{tz}"), raw[m.end() :]
+
+
+def _since_seconds(since: datetime) -> int:
+    # round up, lines before `since` are dropped by stream_logs anyway
+    return max(1, math.ceil((datetime.now(timezone.utc) - since).total_seconds()))
+
+
+def _kubectl_lines(cmd: List[str], timeout: Optional[float] = None) -> Iterator[str]:
+    """
+    Yield kubectl's stdout line by line. stderr goes to a temporary file so a
+    chatty kubectl cannot block on a full pipe; the process is killed once
+    `timeout` seconds have passed.
+    """
+    logger.debug(f"Running command: {' '.join(cmd)}")
+    err_fh = tempfile.TemporaryFile(mode="w+")
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=err_fh,
+            text=True,
+            bufsize=1,
+        )
+    except FileNotFoundError as e:
+        err_fh.close()
+        raise KubeError("kubectl not found. Please install kubectl.") from e
+
+    timed_out = threading.Event()
+
+    def _on_timeout() -> None:
+        timed_out.set()
+        proc.kill()
+
+    timer = None
+    if timeout is not None and timeout > 0:
+        timer = threading.Timer(timeout, _on_timeout)
+        timer.daemon = True
+        timer.start()
+
+    assert proc.stdout is not None
+    try:
+        for line in proc.stdout:
+            yield line.rstrip("\n")
+        rc = proc.wait()
+        if timed_out.is_set():
+            raise KubeError(f"kubectl timed out after {timeout}s")
+        if rc != 0:
+            err_fh.seek(0)
+            raise KubeError(f"kubectl failed (rc={rc}): {err_fh.read().strip()}")
+    finally:
+        if timer is not None:
+            timer.cancel()
+        # consumer stopped early (tail reached, until bound, generator closed)
+        if proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        err_fh.close()
+
+
+def _raw_lines(
+    pod_name: str,
+    env: Environment,
+    namespace: str,
+    *,
+    since: Optional[datetime],
+    tail: Optional[int],
+    follow: bool,
+    timeout: Optional[float],
+) -> Iterator[str]:
+    kube_ctx = prepare_context(env)
+    if kube_api.is_enabled():
+        lines = kube_api.stream_pod_log(
+            kube_ctx,
+            namespace,
+            pod_name,
+            since_seconds=None if since is None else _since_seconds(since),
+            tail_lines=tail,
+            follow=follow,
+            timestamps=True,
+            timeout=timeout,
+        )
+        try:
+            # fall back to kubectl only if the API fails before the first line
+            first = next(lines, None)
+        except Exception as e:
+            if kube_api.is_required():
+                raise KubeError(f"Kubernetes API log read failed: {e}") from e
+            logger.warning(f"Kubernetes API log read failed ({e}), using kubectl")
+        else:
+            if first is not None:
+                yield first
+                yield from lines
+            return
+
+    cmd = kubectl_cmd(env, "logs", "-n", namespace, pod_name, "--timestamps")
+    if since is not None:
+        cmd.append(f"--since-time={since.isoformat()}")
+    if tail is not None:
+        cmd.append(f"--tail={tail}")
+    if follow:
+        cmd.append("--follow")
+    yield from _kubectl_lines(cmd, timeout)
+
+
+def stream_logs(
+    pod_name: str,
+    env: Environment,
+    namespace: Namespace | str,
+    *,
+    tail: Optional[int] = None,
+    since_time: Optional[str] = None,
+    until_time: Optional[str] = None,
+    follow: bool = False,
+    pattern: Optional[str] = None,
+    levels: Optional[Iterable[str]] = None,
+    timeout: Optional[float] = None,
+) -> Iterator[LogLine]:
+    """
+    Yield the pod's log lines one by one, in constant memory.
+
+    :param tail: Only the last N lines (applied by the server, before filtering)
+    :param since_time: ISO time; skip lines logged before it
+    :param until_time: ISO time; stop at the first line logged after it
+    :param follow: Keep streaming new lines (until `until_time`, if given)
+    :param pattern: Regex; only lines matching it are yielded
+    :param levels: Only lines with one of these levels (e.g. ["ERROR", "WARN"]);
+                   lines without a level (stack traces) inherit the previous one
+    """
+    since = None if since_time is None else parse_time(since_time)
+    until = None if until_time is None else parse_time(until_time)
+    regex = None if pattern is None else re.compile(pattern)
+    wanted = None if levels is None else {normalize_level(x) for x in levels}
+
+    last_level: Optional[str] = None
+    for raw in _raw_lines(
+        pod_name,
+        env,
+        namespace,
+        since=since,
+        tail=tail,
+        follow=follow,
+        timeout=timeout,
+    ):
+        ts, text = _split_timestamp(raw)
+        if ts is not None:
+            if since is not None and ts < since:
+                continue
+            if until is not None and ts > until:
+                return
+
+        level = parse_level(text) or last_level
+        last_level = level
+        if wanted is not None and level not in wanted:
+            continue
+        if regex is not None and regex.search(text) is None:
+            continue
+
+        yield LogLine(
+            timestamp=ts, text=text, level=level, namespace=namespace, pod=pod_name
+        )
+
+
+# ----------------- multi-pod aggregation -----------------
+
+MAX_AGGREGATED_PODS = 20
+_QUEUE_SIZE = 1000
+_END = object()
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _sort_key(line: LogLine) -> datetime:
+    return line.timestamp or _EPOCH
+
+
+def _pump(
+    lines: Iterator[LogLine], out: "queue.Queue[object]", stop: threading.Event
+) -> None:
+    def _put(item: object) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for line in lines:
+            if not _put(line):
+                return
+    except Exception as e:
+        _put(e)
+    finally:
+        close = getattr(lines, "close", None)
+        if close is not None:
+            close()
+    _put(_END)
+
+
+def _drain(source: "queue.Queue[object]", label: str) -> Iterator[LogLine]:
+    while True:
+        item = source.get()
+        if item is _END:
+            return
+        if isinstance(item, Exception):
+            logger.warning(f"Failed to read logs of {label}: {item}")
+            return
+        yield item  # type: ignore[misc]
+
+
+def find_matching_pods(
+    fuzzy_pod_name: str,
+    env: Environment,
+    namespaces: Sequence[str],
+    *,
+    min_score=90,
+    max_workers: int = 8,
+) -> List[Tuple[str, str]]:
+    """
+    Return (namespace, pod) for every pod matching `fuzzy_pod_name` in any of
+    `namespaces`, listing the namespaces concurrently.
+    """
+
+    def _find(ns: str) -> List[Tuple[str, str]]:
+        try:
+            matches = find_pod_names_fuzzy(fuzzy_pod_name, env, ns, min_score=min_score)
+        except KubeError as e:
+            logger.warning(f"Failed to list pods in {env}/{ns}: {e}")
+            return []
+        return [(ns, pod) for pod, _ in matches]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(namespaces)))) as ex:
+        return [x for found in ex.map(_find, namespaces) for x in found]
+
+
+def aggregate_logs(
+    fuzzy_pod_name: str,
+    env: Environment,
+    namespaces: Sequence[str],
+    *,
+    min_score=90,
+    tail: Optional[int] = None,
+    since_time: Optional[str] = None,
+    until_time: Optional[str] = None,
+    pattern: Optional[str] = None,
+    levels: Optional[Iterable[str]] = None,
+    timeout: Optional[float] = None,
+) -> Iterator[LogLine]:
+    """
+    Yield the logs of every pod matching `fuzzy_pod_name` in `namespaces`
+    as one stream ordered by timestamp.
+
+    Each pod is read concurrently by its own thread into a bounded queue and
+    the queues are k-way merged with a heap, so memory stays bounded by the
+    queue size times the number of pods. Filters are the same as
+    `stream_logs`; `tail` applies per pod.
+    """
+    pods = find_matching_pods(fuzzy_pod_name, env, namespaces, min_score=min_score)
+    if len(pods) > MAX_AGGREGATED_PODS:
+        logger.warning(
+            f"{len(pods)} pods match '{fuzzy_pod_name}', reading the first {MAX_AGGREGATED_PODS}"
+        )
+        pods = pods[:MAX_AGGREGATED_PODS]
+    logger.info(f"Aggregating logs of {len(pods)} pods: {pods}")
+
+    stop = threading.Event()
+    sources = []
+    for ns, pod in pods:
+        q: "queue.Queue[object]" = queue.Queue(maxsize=_QUEUE_SIZE)
+        lines = stream_logs(
+            pod,
+            env,
+            ns,
+            tail=tail,
+            since_time=since_time,
+            until_time=until_time,
+            pattern=pattern,
+            levels=levels,
+            timeout=timeout,
+        )
+        threading.Thread(
+            target=_pump, args=(lines, q, stop), name=f"logs-{pod}", daemon=True
+        ).start()
+        sources.append(_drain(q, f"{env}/{ns}/{pod}"))
+
+    try:
+        yield from heapq.merge(*sources, key=_sort_key)
+    finally:
+        stop.set()
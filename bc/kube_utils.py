@@ -1,15 +1,25 @@
 from datetime import datetime
+import atexit
 import os
+import re
 import shutil
 import signal
 import subprocess
-from dataclasses import dataclass
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Literal, Optional
+from typing import Callable, Dict, List, Literal, Optional, Tuple
 
 from app_types import Environment
+from bc import kube_api
 from logger import get_logger
-from sh_utils import check_cmd_exists, is_port_in_use, run_cmd
+from sh_utils import (
+    check_cmd_exists,
+    is_port_in_use,
+    is_port_open,
+    run_cmd,
+)
 from rapidfuzz import process, fuzz
 
 logger = get_logger(__name__)
@@ -80,14 +90,6 @@ class PortForwardError(KubeError):
     pass
 
 
-@dataclass
-class PortForwardHandle:
-    process: subprocess.Popen
-    log_path: Path
-    env: Environment
-    ns: str
-
-
 def maybe_connect_vpn(kube_context: str, vpn_name: str = "DedicatedVPN") -> None:
     if kube_context == "dev":
         return
@@ -102,33 +104,46 @@ def maybe_connect_vpn(kube_context: str, vpn_name: str = "DedicatedVPN") -> None
         logger.info("vpnutil not found, skipping VPN connection step.")
 
 
-def _current_kube_context() -> str:
-    try:
-        out = run_cmd(
-            ["kubectl", "config", "current-context"], capture_output=True
-        ).stdout.strip()
-        return out
-    except subprocess.CalledProcessError:
-        return ""
+def kube_context(environment: Environment) -> str:
+    return "shared" if environment == "prod" else environment
 
 
-def get_logs(
-    pod_name: str,
-    env: Environment,
-    namespace: Namespace,
-    *,
-    timeout=10,
-    since_time: Optional[str] = None,
-) -> str:
+_prepared_contexts: set[str] = set()
+_prepare_lock = threading.Lock()
+
+
+def prepare_context(environment: Environment) -> str:
     """
-    Return the logs of the specified pod.
+    Run the one-time cluster preflight for `environment` (VPN, required
+    tools) and return its kube context name.
+
+    The preflight runs once per context per process. No process-global
+    state is changed: the current kubectl context and the az subscription
+    are left alone, every kubectl call passes --context instead (see
+    `kubectl_cmd`), so several environments can be used at once.
     """
-    cmd = ["kubectl", "logs", "-n", namespace, pod_name]
-    if since_time is not None:
-        cmd += ["--since-time", since_time]
+    kube_ctx = kube_context(environment)
+    with _prepare_lock:
+        if kube_ctx in _prepared_contexts:
+            return kube_ctx
+
+        maybe_connect_vpn(kube_ctx)
+        check_cmd_exists("kubectl", "'kubectl' is required. Please install it.")
+        # the kubeconfig's credential plugin authenticates through az
+        check_cmd_exists("az", "Azure CLI 'az' is required.")
+        logger.info(f"Prepared kube-context {kube_ctx}")
+        _prepared_contexts.add(kube_ctx)
+    return kube_ctx
+
+
+def kubectl_cmd(environment: Environment, *args: str) -> List[str]:
+    """Build a kubectl command bound to the context of `environment`."""
+    return ["kubectl", "--context", prepare_context(environment), *args]
+
+
+def _run_kubectl(cmd: List[str], *, timeout: Optional[float]) -> str:
     logger.debug(f"Running command: {' '.join(cmd)}")
     try:
-        switch_context(env)
         result = subprocess.run(
             cmd,
             check=True,
@@ -145,6 +160,139 @@ def get_logs(
         raise KubeError(f"kubectl failed: {e}") from e
 
 
+def list_pod_names(
+    environment: Environment,
+    namespace: str,
+    *,
+    label_selector: Optional[str] = None,
+    timeout=10,
+) -> List[str]:
+    """
+    Return the names of the pods in `namespace`, through the Kubernetes API
+    when available and `kubectl get po` otherwise.
+    """
+    kube_ctx = prepare_context(environment)
+    if kube_api.is_enabled():
+        try:
+            return kube_api.list_pod_names(
+                kube_ctx, namespace, label_selector=label_selector, timeout=timeout
+            )
+        except Exception as e:
+            if kube_api.is_required():
+                raise KubeError(f"Kubernetes API pod listing failed: {e}") from e
+            logger.warning(f"Kubernetes API pod listing failed ({e}), using kubectl")
+
+    cmd = kubectl_cmd(environment, "get", "po", "-n", namespace)
+    if label_selector is not None:
+        cmd += ["-l", label_selector]
+    stdout = _run_kubectl(cmd, timeout=timeout)
+    return [line.split()[0] for line in stdout.splitlines()[1:] if line.strip()]
+
+
+# ----------------- pod inventory -----------------
+
+POD_INVENTORY_TTL = float(os.getenv("POD_INVENTORY_TTL", "30"))
+
+
+@dataclass
+class PodInventoryEntry:
+    names: List[str]
+    loaded_at: float
+
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+
+class PodInventory:
+    """
+    Short-lived cache of pod names per (env, namespace), shared by the fuzzy
+    pod lookup and the bcrest port-forward. It saves the listing call only:
+    entries are the plain names, matching runs on them every time.
+    """
+
+    def __init__(self, ttl: float = POD_INVENTORY_TTL) -> None:
+        self.ttl = ttl
+        self._entries: Dict[Tuple[Environment, str], PodInventoryEntry] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        environment: Environment,
+        namespace: str,
+        *,
+        refresh: bool = False,
+        timeout=10,
+    ) -> PodInventoryEntry:
+        key = (environment, namespace)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and not refresh and entry.age() < self.ttl:
+            return entry
+
+        names = list_pod_names(environment, namespace, timeout=timeout)
+        entry = PodInventoryEntry(
+            names=names,
+            loaded_at=time.monotonic(),
+        )
+        with self._lock:
+            self._entries[key] = entry
+        logger.debug(f"Loaded {len(names)} pods for {environment}/{namespace}")
+        return entry
+
+    def invalidate(
+        self, environment: Optional[Environment] = None, namespace: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            for env, ns in list(self._entries):
+                if environment in (None, env) and namespace in (None, ns):
+                    del self._entries[(env, ns)]
+
+
+_pod_inventory = PodInventory()
+
+
+def get_pod_inventory() -> PodInventory:
+    return _pod_inventory
+
+
+def find_pod_names_fuzzy(
+    pod_name: str,
+    environment: Environment,
+    namespace: Namespace | str,
+    *,
+    min_score=90,
+    limit: Optional[int] = None,
+    timeout=10,
+    refresh: bool = False,
+) -> List[Tuple[str, float]]:
+    """
+    Return (pod name, score) for every pod that fuzzy-matches `pod_name`
+    with at least `min_score` similarity, best first.
+
+    Pod names come from the pod inventory cache and are matched as they are
+    (no preprocessing); on a miss the inventory is reloaded once in case the
+    pod was (re)created since.
+    """
+    def _extract(entry: PodInventoryEntry) -> List[Tuple[str, float]]:
+        # no processor, as in rapidfuzz 3 defaults: matching stays case-sensitive
+        matches = process.extract(
+            pod_name,
+            entry.names,
+            scorer=fuzz.WRatio,
+            processor=None,
+            score_cutoff=min_score,
+            limit=limit,
+        )
+        return [(entry.names[i], score) for _, score, i in matches]
+
+    entry = _pod_inventory.get(environment, namespace, refresh=refresh, timeout=timeout)
+    matches = _extract(entry)
+    if not matches and not refresh:
+        entry = _pod_inventory.get(environment, namespace, refresh=True, timeout=timeout)
+        matches = _extract(entry)
+    return matches
+
+
 def find_pod_name_fuzzy(
     pod_name: str,
     environment: Environment,
@@ -152,36 +300,21 @@ def find_pod_name_fuzzy(
     *,
     min_score=90,
     timeout=10,
-    since_time: Optional[str] = None,  # ISO format string
+    refresh: bool = False,
 ) -> Optional[str]:
     """
     Return the name of a pod that fuzzy-matches `name` with at least 90% similarity.
     """
     logger.debug(f"Finding pod name like '{pod_name}' in {environment}/{namespace}")
 
-    try:
-        switch_context(environment)
-        result = subprocess.run(
-            ["kubectl", "get", "po", "-n", namespace],
-            check=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-    except FileNotFoundError as e:
-        raise KubeError("kubectl not found. Please install kubectl.") from e
-    except subprocess.TimeoutExpired as e:
-        raise KubeError("kubectl command timed out.") from e
-    except subprocess.CalledProcessError as e:
-        raise KubeError(f"kubectl failed: {e}") from e
-
-    pod_names = [line.split()[0] for line in result.stdout.splitlines()[1:]]
-    matches = process.extract(
+    matches = find_pod_names_fuzzy(
         pod_name,
-        pod_names,
-        scorer=fuzz.WRatio,
-        score_cutoff=min_score,
+        environment,
+        namespace,
+        min_score=min_score,
         limit=2,
+        timeout=timeout,
+        refresh=refresh,
     )
     if matches:
         if len(matches) > 1:
@@ -195,102 +328,37 @@ def find_pod_name_fuzzy(
     return None
 
 
-def _get_bcrest_pod_name(env: str, ns: str) -> str:
+def _get_bcrest_pod_name(
+    env: Environment, ns: Optional[str], *, refresh: bool = False
+) -> str:
     """
     Return the first pod name in namespace `shared-<env>-fab` that contains 'bcrest'.
     Raises RuntimeError if no pod is found.
     """
     namespace = f"shared-{env}-fab" if ns is None else ns
     try:
-        # Run kubectl and capture output
-        result = subprocess.run(
-            ["kubectl", "-n", namespace, "get", "po"],
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-    except subprocess.CalledProcessError as e:
-        raise PortForwardError(f"kubectl failed: {e}") from e
+        pod_names = _pod_inventory.get(env, namespace, refresh=refresh).names
+    except KubeError as e:
+        raise PortForwardError(str(e)) from e
 
-    for line in result.stdout.splitlines():
-        if "bcrest" in line:
-            # awk '{print $1}' equivalent = first whitespace-separated token
-            pod_name = line.split()[0]
+    for pod_name in pod_names:
+        if "bcrest" in pod_name:
             return pod_name
 
     raise PortForwardError(f"No bcrest pod found in namespace {namespace}")
 
 
-def switch_context(environment: Environment) -> None:
-    kube_context = "shared" if environment == "prod" else environment
+# ----------------- port-forward pool -----------------
 
-    maybe_connect_vpn(kube_context)
+# (env, namespace, target)
+PortForwardKey = Tuple[Environment, str, str]
 
-    current = _current_kube_context()
-    if current == kube_context:
-        logger.info(f"Already in kube-context: {kube_context}")
-    else:
-        logger.info(f"Switching context {kube_context}")
-        subscription = "dev" if kube_context == "dev" else "prod"
-        check_cmd_exists("az", "Azure CLI 'az' is required.")
-        check_cmd_exists("kubectx", "'kubectx' is required to switch contexts.")
-        run_cmd(["az", "account", "set", f"--subscription={subscription}"])
-        run_cmd(["kubectx", kube_context])
-        now = _current_kube_context()
-        logger.debug(f"Now using context {now}")
+PORT_FORWARD_IDLE_TTL = float(os.getenv("PORT_FORWARD_IDLE_TTL", "300"))
+PORT_FORWARD_READY_TIMEOUT = 15.0
+_REAPER_INTERVAL = 5.0
 
 
-def start_port_forwarding(
-    environment: Environment,
-    *,
-    namespace: Optional[Namespace] = None,
-    port: int = 3000,
-    log_file: str = "port-forward.log",
-    wait_seconds: float = 3.0,
-) -> PortForwardHandle:
-    check_cmd_exists("kubectl", "'kubectl' is required. Please install it.")
-    switch_context(environment)
-
-    ns = f"shared-{environment}-fab" if namespace is None else namespace
-
-    pod_name = _get_bcrest_pod_name(environment, ns=ns)
-    logger.info(f"Found bcrest pod: {pod_name}")
-
-    if is_port_in_use(port):
-        raise PortForwardError(
-            f"Port {port} is already in use. Please choose another port."
-        )
-    
-    logger.info(f"Forwarding port {port} -> {pod_name}:8080 in namespace {namespace}")
-
-    log_path = Path(log_file).resolve()
-    log_fh = open(log_path, "w")
-    proc = subprocess.Popen(
-        ["kubectl", "-n", ns, "port-forward", pod_name, f"{port}:8080"],
-        stdout=log_fh,
-        stderr=subprocess.STDOUT,
-        preexec_fn=os.setsid,
-    )
-
-    try:
-        if wait_seconds > 0:
-            proc.wait(timeout=wait_seconds)
-            rc = proc.returncode
-            if rc is not None:
-                log_fh.close()
-                with open(log_path, "r") as f:
-                    log_tail = f.read()[-2000:]
-                raise PortForwardError(
-                    f"port-forward exited too early (rc={rc}). Log:\n{log_tail}"
-                )
-    except subprocess.TimeoutExpired:
-        pass
-
-    return PortForwardHandle(process=proc, log_path=log_path, env=environment, ns=ns)
-
-
-def stop_port_forwarding(handle: PortForwardHandle) -> None:
-    proc = handle.process
+def _terminate_process(proc: subprocess.Popen) -> None:
     if proc.poll() is not None:
         return
 
@@ -316,3 +384,424 @@ def stop_port_forwarding(handle: PortForwardHandle) -> None:
             proc.wait(timeout=5)
         except Exception:
             pass
+
+
+# "Forwarding from 127.0.0.1:41233 -> 3000", printed once kubectl listens
+_FORWARDING_RE = re.compile(r"Forwarding from 127\.0\.0\.1:(\d+) ->")
+
+
+def _forwarded_port(log_path: Path) -> Optional[int]:
+    """The local port kubectl reports in its log, when it picked one itself."""
+    try:
+        with open(log_path, "r") as f:
+            m = _FORWARDING_RE.search(f.read())
+    except FileNotFoundError:
+        return None
+    return int(m.group(1)) if m else None
+
+
+@dataclass
+class _PooledForward:
+    key: PortForwardKey
+    resolve_target: Callable[[], str]
+    # None: bind a free port chosen at start (kept across restarts if possible)
+    requested_port: Optional[int]
+    remote_port: int
+    log_path: Path
+    local_port: int = 0
+    process: Optional[subprocess.Popen] = None
+    refs: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    restarts: int = 0
+    # close() was asked while leased: stop once the last lease is released
+    close_when_released: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+
+class PortForwardLease:
+    """
+    A reference to a pooled port-forward. Release it when done; the forward
+    itself stays up until it has been idle for the pool's idle TTL.
+    """
+
+    def __init__(self, pool: "PortForwardPool", forward: _PooledForward) -> None:
+        self._pool = pool
+        self._forward = forward
+        self.released = False
+
+    @property
+    def key(self) -> PortForwardKey:
+        return self._forward.key
+
+    @property
+    def port(self) -> int:
+        return self._forward.local_port
+
+    @property
+    def process(self) -> Optional[subprocess.Popen]:
+        return self._forward.process
+
+    @property
+    def log_path(self) -> Path:
+        return self._forward.log_path
+
+    def ensure_alive(self) -> None:
+        """Restart the forward if kubectl has died since it was acquired."""
+        self._pool._ensure_alive(self._forward)
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self._pool._release(self._forward)
+
+    def __enter__(self) -> "PortForwardLease":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class PortForwardPool:
+    """
+    Process-wide pool of long-lived `kubectl port-forward` processes keyed by
+    (env, namespace, target).
+
+    Forwards are refcounted: `acquire` reuses a running forward or starts one
+    and waits until the local port accepts TCP connections. A background
+    reaper stops forwards idle for longer than `idle_ttl` and restarts
+    forwards that died while still leased.
+    """
+
+    def __init__(
+        self,
+        *,
+        idle_ttl: float = PORT_FORWARD_IDLE_TTL,
+        ready_timeout: float = PORT_FORWARD_READY_TIMEOUT,
+    ) -> None:
+        self.idle_ttl = idle_ttl
+        self.ready_timeout = ready_timeout
+        self._forwards: Dict[PortForwardKey, _PooledForward] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._sweep_callbacks: List[Callable[[], None]] = []
+
+    def on_sweep(self, callback: Callable[[], None]) -> None:
+        """
+        Run `callback` on every idle sweep, so owners of leases (e.g. the
+        Mongo connection manager) can release what they no longer use.
+        """
+        with self._lock:
+            self._sweep_callbacks.append(callback)
+
+    def acquire(
+        self,
+        env: Environment,
+        namespace: str,
+        target: str,
+        *,
+        remote_port: int,
+        local_port: Optional[int] = None,
+        resolve_target: Optional[Callable[[], str]] = None,
+        log_file: Optional[str] = None,
+    ) -> PortForwardLease:
+        """
+        Lease the forward for (env, namespace, target), starting it if needed.
+
+        Without `local_port` the forward binds a free port picked by the OS;
+        read it from `lease.port`. With `local_port`, a pooled forward for the
+        key on another port raises PortForwardError.
+
+        `resolve_target` returns the kubectl port-forward target (e.g. a pod
+        name) and is called on every (re)start; by default `target` itself.
+        """
+        key: PortForwardKey = (env, namespace, target)
+        evicted: List[_PooledForward] = []
+        with self._lock:
+            forward = self._forwards.get(key)
+            if (
+                forward is not None
+                and local_port is not None
+                and forward.local_port not in (0, local_port)
+            ):
+                raise PortForwardError(
+                    f"Port-forward {key} is already running on port "
+                    f"{forward.local_port}, not {local_port}"
+                )
+            if forward is None:
+                if local_port is not None:
+                    evicted = self._evict_idle_on_port(local_port)
+                forward = _PooledForward(
+                    key=key,
+                    resolve_target=resolve_target or (lambda: target),
+                    requested_port=local_port,
+                    remote_port=remote_port,
+                    log_path=Path(
+                        log_file or f"port-forward-{env}-{namespace}-{target}.log"
+                    ).resolve(),
+                )
+                self._forwards[key] = forward
+            forward.refs += 1
+            forward.last_used = time.monotonic()
+            forward.close_when_released = False
+            self._start_reaper()
+
+        # stopping waits for the process, keep the pool unlocked meanwhile
+        for other in evicted:
+            self._stop(other)
+        try:
+            self._ensure_alive(forward)
+        except Exception:
+            self._release(forward)
+            raise
+        return PortForwardLease(self, forward)
+
+    def close(self, key: PortForwardKey) -> None:
+        """
+        Stop the forward for `key` now if nobody leases it, otherwise as
+        soon as its last lease is released.
+        """
+        with self._lock:
+            forward = self._forwards.get(key)
+            if forward is None:
+                return
+            if forward.refs > 0:
+                logger.info(
+                    f"Port-forward {key} still has {forward.refs} leases, "
+                    "stopping it once they are released"
+                )
+                forward.close_when_released = True
+                return
+            del self._forwards[key]
+        self._stop(forward)
+
+    def close_all(self) -> None:
+        self._stopping.set()
+        with self._lock:
+            forwards = list(self._forwards.values())
+            self._forwards.clear()
+        for forward in forwards:
+            self._stop(forward)
+
+    # ----------------- internals -----------------
+
+    def _release(self, forward: _PooledForward) -> None:
+        with self._lock:
+            forward.refs = max(0, forward.refs - 1)
+            forward.last_used = time.monotonic()
+            stop = forward.refs == 0 and forward.close_when_released
+            if stop and self._forwards.get(forward.key) is forward:
+                del self._forwards[forward.key]
+        if stop:
+            self._stop(forward)
+
+    def _evict_idle_on_port(self, port: int) -> List[_PooledForward]:
+        """
+        Drop idle forwards of other keys that still hold the local port.
+        Called with the lock held; the caller stops them after releasing it.
+        """
+        evicted: List[_PooledForward] = []
+        for key, other in list(self._forwards.items()):
+            if other.local_port == port and other.refs == 0:
+                logger.info(f"Evicting idle port-forward {key} holding port {port}")
+                del self._forwards[key]
+                evicted.append(other)
+        return evicted
+
+    def _ensure_alive(self, forward: _PooledForward) -> None:
+        with forward.lock:
+            if forward.is_alive():
+                return
+            if forward.process is not None:
+                forward.restarts += 1
+                logger.warning(
+                    f"Port-forward {forward.key} exited (rc={forward.process.returncode}), restarting"
+                )
+            self._start(forward)
+
+    def _start(self, forward: _PooledForward) -> None:
+        port = forward.requested_port
+        if port is not None:
+            if is_port_in_use(port):
+                raise PortForwardError(
+                    f"Port {port} is already in use. Please choose another port."
+                )
+            self._spawn(forward, port)
+            return
+        # keep the previous port on restart so existing clients reconnect
+        if forward.local_port and not is_port_in_use(forward.local_port):
+            try:
+                self._spawn(forward, forward.local_port)
+                return
+            except PortForwardError as e:
+                logger.warning(f"Could not rebind port {forward.local_port}: {e}")
+        # let kubectl bind a free port, no window for another process to take it
+        self._spawn(forward, None)
+
+    def _spawn(self, forward: _PooledForward, port: Optional[int]) -> None:
+        env, ns, _ = forward.key
+        target = forward.resolve_target()
+        logger.info(
+            f"Forwarding port {port or 'auto'} -> {target}:{forward.remote_port} in {env}/{ns}"
+        )
+        cmd = kubectl_cmd(
+            env, "-n", ns, "port-forward", target, f"{port or ''}:{forward.remote_port}"
+        )
+        logger.debug(f"Port-forward command: {' '.join(cmd)}")
+        log_fh = open(forward.log_path, "w")
+        try:
+            forward.process = subprocess.Popen(
+                cmd,
+                stdout=log_fh,
+                stderr=subprocess.STDOUT,
+                preexec_fn=os.setsid,
+            )
+        finally:
+            # the child keeps its own copy of the descriptor
+            log_fh.close()
+        forward.local_port = port or 0
+        self._wait_ready(forward)
+
+    def _wait_ready(self, forward: _PooledForward) -> None:
+        proc = forward.process
+        assert proc is not None
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                with open(forward.log_path, "r") as f:
+                    log_tail = f.read()[-2000:]
+                raise PortForwardError(
+                    f"port-forward exited too early (rc={proc.returncode}). Log:\n{log_tail}"
+                )
+            if not forward.local_port:
+                forward.local_port = _forwarded_port(forward.log_path) or 0
+            if forward.local_port and is_port_open(forward.local_port):
+                logger.debug(f"Port-forward {forward.key} ready on {forward.local_port}")
+                return
+            time.sleep(0.1)
+        _terminate_process(proc)
+        raise PortForwardError(
+            f"port-forward {forward.key} not ready after {self.ready_timeout}s"
+        )
+
+    def _stop(self, forward: _PooledForward) -> None:
+        with forward.lock:
+            if forward.process is not None:
+                _terminate_process(forward.process)
+
+    def _start_reaper(self) -> None:
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(
+                target=self._reap_loop, name="port-forward-reaper", daemon=True
+            )
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        while not self._stopping.wait(_REAPER_INTERVAL):
+            with self._lock:
+                callbacks = list(self._sweep_callbacks)
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Port-forward sweep callback failed: {e}")
+            self._reap()
+
+    def _reap(self) -> None:
+        now = time.monotonic()
+        expired: List[_PooledForward] = []
+        leased: List[_PooledForward] = []
+        with self._lock:
+            for key, forward in list(self._forwards.items()):
+                if forward.refs == 0 and now - forward.last_used > self.idle_ttl:
+                    del self._forwards[key]
+                    expired.append(forward)
+                elif forward.refs > 0 and not forward.is_alive():
+                    leased.append(forward)
+        for forward in expired:
+            logger.info(f"Port-forward {forward.key} idle, stopping")
+            self._stop(forward)
+        for forward in leased:
+            try:
+                self._ensure_alive(forward)
+            except Exception as e:
+                logger.error(f"Failed to restart port-forward {forward.key}: {e}")
+
+
+_pool = PortForwardPool()
+atexit.register(_pool.close_all)
+
+
+def get_port_forward_pool() -> PortForwardPool:
+    return _pool
+
+
+@dataclass
+class PortForwardHandle:
+    lease: PortForwardLease
+    env: Environment
+    ns: str
+
+    @property
+    def port(self) -> int:
+        return self.lease.port
+
+    @property
+    def process(self) -> Optional[subprocess.Popen]:
+        return self.lease.process
+
+    @property
+    def log_path(self) -> Path:
+        return self.lease.log_path
+
+
+def start_port_forwarding(
+    environment: Environment,
+    *,
+    namespace: Optional[Namespace] = None,
+    port: Optional[int] = None,
+    log_file: Optional[str] = None,
+) -> PortForwardHandle:
+    """
+    Lease a pooled port-forward to the bcrest pod of `environment`.
+
+    The local port is picked by the OS unless `port` is given; use
+    `handle.port` to reach the api.
+    """
+    prepare_context(environment)
+
+    ns = f"shared-{environment}-fab" if namespace is None else namespace
+
+    starts = 0
+
+    def _resolve_pod() -> str:
+        # a restart means the forward died, possibly with its pod
+        nonlocal starts
+        pod_name = _get_bcrest_pod_name(environment, ns=ns, refresh=starts > 0)
+        starts += 1
+        logger.info(f"Found bcrest pod: {pod_name}")
+        return pod_name
+
+    lease = _pool.acquire(
+        environment,
+        ns,
+        "bcrest",
+        remote_port=8080,
+        local_port=port,
+        resolve_target=_resolve_pod,
+        log_file=log_file,
+    )
+    return PortForwardHandle(lease=lease, env=environment, ns=ns)
+
+
+def stop_port_forwarding(handle: PortForwardHandle, *, force: bool = False) -> None:
+    """
+    Release the lease; the pool stops the forward once it has been idle,
+    or with `force` as soon as no other lease holds it.
+    """
+    handle.lease.release()
+    if force:
+        _pool.close(handle.lease.key)
@@ -0,0 +1,404 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app_types import Environment
+from bc.kube_logs import LogLine, normalize_level, parse_time, stream_logs
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# bump when the tables change; the store is a cache, older files are rebuilt
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_lines (
+    id INTEGER PRIMARY KEY,
+    env TEXT NOT NULL,
+    ns TEXT NOT NULL,
+    pod TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    -- position among the pod's lines with the same timestamp, so repeated
+    -- lines are kept while re-downloaded ones are ignored
+    seq INTEGER NOT NULL,
+    level TEXT,
+    text TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS log_lines_key ON log_lines (env, ns, pod, ts, seq);
+CREATE INDEX IF NOT EXISTS log_lines_ts ON log_lines (ts);
+CREATE TABLE IF NOT EXISTS log_segments (
+    env TEXT NOT NULL,
+    ns TEXT NOT NULL,
+    pod TEXT NOT NULL,
+    start_ts TEXT NOT NULL,
+    end_ts TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS log_segments_key ON log_segments (env, ns, pod, start_ts);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS log_lines_fts
+    USING fts5(text, content='log_lines', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS log_lines_ai AFTER INSERT ON log_lines BEGIN
+    INSERT INTO log_lines_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS log_lines_ad AFTER DELETE ON log_lines BEGIN
+    INSERT INTO log_lines_fts (log_lines_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+END;
+"""
+
+_DROP_SCHEMA = """
+DROP TRIGGER IF EXISTS log_lines_ai;
+DROP TRIGGER IF EXISTS log_lines_ad;
+DROP TABLE IF EXISTS log_lines_fts;
+DROP TABLE IF EXISTS log_lines;
+DROP TABLE IF EXISTS log_segments;
+"""
+
+LOG_STORE_RETENTION_DAYS = float(os.getenv("LOG_STORE_RETENTION_DAYS", "7"))
+LOG_STORE_MAX_LINES = int(os.getenv("LOG_STORE_MAX_LINES", "2000000"))
+_PRUNE_INTERVAL = 600.0
+# the last minute before now is never marked as downloaded: lines logged in
+# it can still arrive late, so it is downloaded again by the next fetch
+_SETTLE_MARGIN = timedelta(seconds=60)
+_QUERY_BATCH_SIZE = 500
+
+Segment = Tuple[str, str]
+
+
+def _resolve_store_path() -> Path:
+    """
+    Determine the log store location.
+
+    Priority:
+    1) LOG_STORE_PATH in environment (e.g., from .env)
+    2) default to 'logs.sqlite3' in CWD
+    """
+    env_path = os.getenv("LOG_STORE_PATH")
+    return Path(env_path) if env_path else Path("logs.sqlite3")
+
+
+def _ts(value: datetime) -> str:
+    # fixed-width UTC so that timestamps compare correctly as strings
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _missing(segments: List[Segment], start: str, end: str) -> List[Segment]:
+    """Return the parts of [start, end] not covered by sorted `segments`."""
+    gaps: List[Segment] = []
+    cursor = start
+    for seg_start, seg_end in segments:
+        if seg_end < cursor:
+            continue
+        if seg_start > end:
+            break
+        if seg_start > cursor:
+            gaps.append((cursor, seg_start))
+        cursor = max(cursor, seg_end)
+        if cursor >= end:
+            return gaps
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def _fts_phrase(text: str) -> str:
+    """Quote `text` as one FTS5 phrase, so '-', ':' etc. are not operators."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _merge(segments: List[Segment]) -> List[Segment]:
+    merged: List[Segment] = []
+    for start, end in sorted(segments):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class LogStore:
+    """
+    Local SQLite store of downloaded pod logs, indexed by (env, ns, pod, ts)
+    with an FTS5 full-text index on the log text.
+
+    `fetch` remembers which time windows have been downloaded per pod, so an
+    overlapping window only downloads the parts not stored yet (usually the
+    tail since the previous question). Queries then run locally.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        *,
+        retention_days: float = LOG_STORE_RETENTION_DAYS,
+        max_lines: int = LOG_STORE_MAX_LINES,
+    ) -> None:
+        self.path = path or _resolve_store_path()
+        self.retention_days = retention_days
+        self.max_lines = max_lines
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self._conn.executescript(_DROP_SCHEMA)
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 not available ({e}), text search uses LIKE")
+            self.full_text = False
+        self._conn.commit()
+        self._pruned_at = 0.0
+        self.prune()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ----------------- download -----------------
+
+    def _segments(self, env: str, ns: str, pod: str) -> List[Segment]:
+        rows = self._conn.execute(
+            "SELECT start_ts, end_ts FROM log_segments WHERE env=? AND ns=? AND pod=? ORDER BY start_ts",
+            (env, ns, pod),
+        ).fetchall()
+        return [(r[0], r[1]) for r in rows]
+
+    def _save_segment(self, env: str, ns: str, pod: str, segment: Segment) -> None:
+        merged = _merge(self._segments(env, ns, pod) + [segment])
+        self._conn.execute(
+            "DELETE FROM log_segments WHERE env=? AND ns=? AND pod=?", (env, ns, pod)
+        )
+        self._conn.executemany(
+            "INSERT INTO log_segments (env, ns, pod, start_ts, end_ts) VALUES (?, ?, ?, ?, ?)",
+            [(env, ns, pod, s, e) for s, e in merged],
+        )
+
+    def fetch(
+        self,
+        env: Environment,
+        ns: str,
+        pod: str,
+        *,
+        since_time: str,
+        until_time: Optional[str] = None,
+        batch_size: int = 1000,
+    ) -> int:
+        """
+        Make sure the logs of `pod` between since_time and until_time (default:
+        now) are stored, downloading only the missing windows. Returns the
+        number of lines downloaded.
+        """
+        now = datetime.now(timezone.utc)
+        start = _ts(parse_time(since_time))
+        end = _ts(min(now, parse_time(until_time)) if until_time else now)
+        if start >= end:
+            return 0
+        settled = _ts(now - _SETTLE_MARGIN)
+
+        with self._lock:
+            gaps = _missing(self._segments(env, ns, pod), start, end)
+
+        downloaded = 0
+        for gap_start, gap_end in gaps:
+            logger.debug(f"Downloading logs of {env}/{ns}/{pod} from {gap_start} to {gap_end}")
+            lines = stream_logs(pod, env, ns, since_time=gap_start, until_time=gap_end)
+            batch: List[tuple] = []
+            prev_ts, seq = None, 0
+            for line in lines:
+                if line.timestamp is None:
+                    continue
+                ts = _ts(line.timestamp)
+                seq = seq + 1 if ts == prev_ts else 0
+                prev_ts = ts
+                batch.append((env, ns, pod, ts, seq, line.level, line.text))
+                if len(batch) >= batch_size:
+                    downloaded += self._insert(batch)
+                    batch = []
+            downloaded += self._insert(batch)
+            covered = (gap_start, min(gap_end, settled))
+            if covered[0] < covered[1]:
+                with self._lock:
+                    self._save_segment(env, ns, pod, covered)
+                    self._conn.commit()
+
+        if gaps:
+            logger.info(f"Stored {downloaded} new log lines of {env}/{ns}/{pod}")
+            if time.monotonic() - self._pruned_at > _PRUNE_INTERVAL:
+                self.prune()
+        else:
+            logger.debug(f"Logs of {env}/{ns}/{pod} served from the local store")
+        return downloaded
+
+    def _insert(self, rows: List[tuple]) -> int:
+        if not rows:
+            return 0
+        with self._lock:
+            cur = self._conn.executemany(
+                "INSERT OR IGNORE INTO log_lines (env, ns, pod, ts, seq, level, text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    # ----------------- retention -----------------
+
+    def prune(self) -> int:
+        """
+        Delete lines older than `retention_days`, then the oldest lines
+        beyond `max_lines`. Downloaded windows are cut at the same point, so
+        pruned periods are downloaded again when asked for. Returns the
+        number of lines deleted.
+        """
+        cutoff = _ts(datetime.now(timezone.utc) - timedelta(days=self.retention_days))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ts FROM log_lines ORDER BY ts DESC LIMIT 1 OFFSET ?",
+                (self.max_lines,),
+            ).fetchone()
+            if row is not None:
+                # everything up to and including the first line over the limit
+                cutoff = max(cutoff, row[0] + "~")
+            deleted = self._conn.execute(
+                "DELETE FROM log_lines WHERE ts < ?", (cutoff,)
+            ).rowcount
+            self._conn.execute("DELETE FROM log_segments WHERE end_ts <= ?", (cutoff,))
+            self._conn.execute(
+                "UPDATE log_segments SET start_ts = ? WHERE start_ts < ?", (cutoff, cutoff)
+            )
+            self._conn.commit()
+        self._pruned_at = time.monotonic()
+        if deleted:
+            logger.info(f"Pruned {deleted} log lines older than {cutoff}")
+        return deleted
+
+    # ----------------- queries -----------------
+
+    def query(
+        self,
+        env: Environment,
+        ns: str,
+        pod: Optional[str] = None,
+        *,
+        since_time: Optional[str] = None,
+        until_time: Optional[str] = None,
+        text: Optional[str] = None,
+        levels: Optional[Iterable[str]] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[LogLine]:
+        """
+        Yield stored lines, ordered by time. `text` is an FTS5 match
+        expression (e.g. 'timeout OR "connection reset"'); text that is not a
+        valid expression (e.g. 'connection-refused') is matched as a phrase.
+        """
+        sql = "SELECT l.ts, l.text, l.level, l.ns, l.pod FROM log_lines l"
+        where = ["l.env = ?", "l.ns = ?"]
+        params: List[object] = [env, ns]
+        match_param: Optional[int] = None
+        if text is not None:
+            if self.full_text:
+                sql += " JOIN log_lines_fts f ON f.rowid = l.id"
+                where.append("log_lines_fts MATCH ?")
+                match_param = len(params)
+                params.append(text)
+            else:
+                where.append("l.text LIKE ?")
+                params.append(f"%{text}%")
+        if pod is not None:
+            where.append("l.pod = ?")
+            params.append(pod)
+        if since_time is not None:
+            where.append("l.ts >= ?")
+            params.append(_ts(parse_time(since_time)))
+        if until_time is not None:
+            where.append("l.ts <= ?")
+            params.append(_ts(parse_time(until_time)))
+        if levels is not None:
+            wanted = sorted({normalize_level(x) for x in levels})
+            where.append(f"l.level IN ({', '.join('?' for _ in wanted)})")
+            params.extend(wanted)
+        sql += " WHERE " + " AND ".join(where) + " ORDER BY l.ts, l.id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            try:
+                cur = self._conn.execute(sql, params)
+            except sqlite3.OperationalError:
+                if text is None or match_param is None:
+                    raise
+                params[match_param] = _fts_phrase(text)
+                cur = self._conn.execute(sql, params)
+        try:
+            while True:
+                with self._lock:
+                    rows = cur.fetchmany(_QUERY_BATCH_SIZE)
+                if not rows:
+                    return
+                for ts, line, level, n, p in rows:
+                    yield LogLine(
+                        timestamp=parse_time(ts),
+                        text=line,
+                        level=level,
+                        namespace=n,
+                        pod=p,
+                    )
+        finally:
+            cur.close()
+
+    def logs(
+        self,
+        env: Environment,
+        ns: str,
+        pod: str,
+        *,
+        since_time: str,
+        until_time: Optional[str] = None,
+        text: Optional[str] = None,
+        pattern: Optional[str] = None,
+        levels: Optional[Iterable[str]] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[LogLine]:
+        """Download what is missing for the window, then answer from the store."""
+        self.fetch(env, ns, pod, since_time=since_time, until_time=until_time)
+        regex = None if pattern is None else re.compile(pattern)
+        for line in self.query(
+            env,
+            ns,
+            pod,
+            since_time=since_time,
+            until_time=until_time,
+            text=text,
+            levels=levels,
+            limit=None if regex is not None else limit,
+        ):
+            if regex is not None:
+                if regex.search(line.text) is None:
+                    continue
+                if limit is not None:
+                    if limit <= 0:
+                        return
+                    limit -= 1
+            yield line
+
+
+_store: Optional[LogStore] = None
+_store_lock = threading.Lock()
+
+
+def get_log_store() -> LogStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LogStore()
+        return _store
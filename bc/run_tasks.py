@@ -1,19 +1,91 @@
-from typing import Any, Dict, List, Set
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-from app_types import AssetType, Environment
-from bc.cache_utils import reload_cache
-from bc.chaincode_api import BlockchainApi
+from app_types import AssetType, Environment, Operation
+from asset_spec import ASSET_SPECS
+from bc.asset_index import AssetMatcher
+from bc.cache_utils import CacheProbe, reload_cache, sentinel_probe
+from bc.chaincode_api import BlockchainApi, id_mapper
+from bc.snapshots import SnapshotWriter, new_run_id, read_snapshot
+from db import get_connection_manager
 from logger import get_logger
 from operation_helpers import ExecutionTask
+from org_index import invalidate_organization_index
 
 logger = get_logger(__name__)
 
+# (asset type, id predicate, operation, orgs to check or None for all)
+CacheSentinel = Tuple[AssetType, Dict[str, Any], Operation, Optional[List[str]]]
 
-def _create_predicate_fn(pred: Dict[str, Any]):
-    def _matches(asset: Dict[str, Any]) -> bool:
-        return all(asset.get(k) == v for k, v in pred.items())
 
-    return _matches
+def _cache_sentinel(tasks: List[ExecutionTask]) -> Optional[CacheSentinel]:
+    """
+    The last asset updated or deleted by `tasks` (created when nothing was
+    updated or deleted), to check the refreshed cache with.
+    """
+    created: Optional[CacheSentinel] = None
+    for task in reversed(tasks):
+        if not task.patches:
+            continue
+        patch = task.patches[-1]
+        if task.operation in ("update", "delete"):
+            return task.asset_type, patch.predicate, task.operation, None
+        if task.operation == "create" and created is None:
+            id_key = id_mapper(task.asset_type)
+            asset_id = patch.patch.get(id_key)
+            # only the orgs the new asset is meant for can see it
+            candidates = [
+                patch.patch.get("organizationId"),
+                *(patch.patch.get("visibleTo") or []),
+            ]
+            orgs = [o for o in candidates if isinstance(o, str)]
+            if asset_id is not None and orgs:
+                created = (task.asset_type, {id_key: asset_id}, "create", orgs)
+    return created
+
+
+def _refresh_cache(
+    environment: Environment,
+    cache_types: Set[AssetType],
+    dry_run: bool,
+    probe: Optional[CacheProbe] = None,
+) -> None:
+    """
+    Refresh the ultra-cache of `cache_types`; with a `probe`, wait until
+    every organization's cache passes it.
+    """
+    logger.info(f"Refreshing cache for asset types={", ".join(cache_types)}")
+    if not dry_run:
+        try:
+            if probe is None:
+                report = reload_cache(environment, None, list(cache_types), None)
+            else:
+                report = reload_cache(
+                    environment,
+                    None,
+                    list(cache_types),
+                    None,
+                    wait=True,
+                    probe=probe,
+                )
+            for failed in report.failed:
+                logger.warning(
+                    "Cache refresh failed for org=%s: %s",
+                    failed.org,
+                    failed.error or failed.status_code,
+                )
+            for stale in report.stale:
+                logger.warning("Cache of org=%s may still be stale", stale.org)
+        except Exception as e:
+            logger.warning(
+                "Failed to refresh cache for asset types=%s: %s",
+                ", ".join(cache_types),
+                e,
+            )
+        if "Organization" in cache_types:
+            invalidate_organization_index(environment)
+    logger.info("Cache refresh completed")
 
 
 def run_tasks(
@@ -21,33 +93,116 @@ def run_tasks(
     environment: Environment,
     tasks: List[ExecutionTask],
     dry_run: bool = True,
-) -> None:
+    run_id: Optional[str] = None,
+    snapshots_dir: Optional[Path] = None,
+    port: int,
+    wait_for_cache: bool = False,
+) -> Optional[str]:
     """
     Apply create/update/delete asset operations against the blockchain API.
 
+    Before anything is written, the previous state of every created, updated
+    or deleted asset is persisted under `run_id` (see bc.snapshots), so the
+    whole run can be reverted with `rollback(run_id)`. Returns the run id, or
+    None when nothing was done. `port` is the local port of the bcrest
+    port-forward (see `PortForwardHandle.port`). With `wait_for_cache` the
+    call returns only once the ultra-cache shows the last written asset (or
+    the refresh deadline passed) instead of right after triggering it.
+
     Uses logger for structured logging instead of print.
     """
 
-    api = BlockchainApi("localhost", 3000, dry_run)
+    api = BlockchainApi("localhost", port, dry_run)
 
     if not tasks:
         logger.info("No asset operations to perform.")
-        return
+        return None
 
+    run_id = run_id or new_run_id()
+    logger.info("Run id: %s", run_id)
     logger.info("Dry run mode: %s", dry_run)
     logger.info("Blockchain url: %s", api.base_url)
 
+    with ExitStack() as stack:
+        probe = None
+        sentinel = None
+        if wait_for_cache and not dry_run:
+            sentinel = _cache_sentinel(tasks)
+        if sentinel is not None:
+            try:
+                # held until the refresh is checked, which can outlast the idle TTL
+                hold = get_connection_manager().hold(environment)
+                client = stack.enter_context(hold)
+                # the baselines must be read before anything is written
+                probe = sentinel_probe(client, *sentinel)
+            except Exception as e:
+                logger.warning("Cannot wait for the cache refresh: %s", e)
+
+        # nothing is written in dry run mode, so there is nothing to roll back
+        snapshot = (
+            None if dry_run else SnapshotWriter(run_id, environment, snapshots_dir)
+        )
+        try:
+            cache_types = _apply_tasks(api, tasks, snapshot)
+        finally:
+            if snapshot is not None:
+                snapshot.close()
+
+        _refresh_cache(environment, cache_types, dry_run, probe)
+
+    logger.info("Asset operations completed successfully (run id: %s)", run_id)
+    return run_id
+
+
+def _apply_tasks(
+    api: BlockchainApi,
+    tasks: List[ExecutionTask],
+    snapshot: Optional[SnapshotWriter],
+) -> Set[AssetType]:
+    """
+    Execute `tasks` and return the affected asset types.
+
+    Before-images are flushed to `snapshot` before each batch is written.
+    """
+
+    def _record(asset_type: AssetType, asset_id: Any, before: Optional[dict]):
+        if snapshot is not None:
+            snapshot.record(asset_type, str(asset_id), before)
+
+    def _flush():
+        if snapshot is not None:
+            snapshot.flush()
+
     cache_types: Set[AssetType] = set()
 
     for task in tasks:
         asset_type = task.asset_type
         cache_types.add(asset_type)
+        id_key = id_mapper(asset_type)
         logger.info(
             "Processing operation=%s for asset type=%s", task.operation, asset_type
         )
 
         if task.operation == "create":
-            batch_creates = [p.patch for p in task.patches]
+            batch_creates: List[Dict[str, Any]] = []
+            for p in task.patches:
+                # without an id the asset could not be found again to roll it back
+                if snapshot is not None and p.patch.get(id_key) is None:
+                    logger.error(
+                        "Skipping create of %s without %s: %s",
+                        asset_type,
+                        id_key,
+                        p.patch,
+                    )
+                    continue
+                batch_creates.append(p.patch)
+            if snapshot is not None:
+                # SAVE is an upsert; keep whatever it is about to overwrite
+                ids = [str(a.get(id_key)) for a in batch_creates]
+                existing = api.find_existing(asset_type, ids)
+                for aid in ids:
+                    _record(asset_type, aid, existing.get(aid))
+                _flush()
             for new_asset in batch_creates:
                 logger.debug(
                     "Creating new asset of type %s with data: %s", asset_type, new_asset
@@ -67,20 +222,14 @@ def run_tasks(
             )
 
         elif task.operation == "delete":
-            assets = api.find_all(asset_type)
+            assets = AssetMatcher(
+                api.iter_all(asset_type), ASSET_SPECS.get(asset_type)
+            )
             logger.info("Found %d assets of type %s", len(assets), asset_type)
 
-            try:
-                from bc.chaincode_api import id_mapper
-
-                id_key = id_mapper(asset_type)
-            except Exception:
-                id_key = "id"
-
             to_delete_ids: List[str] = []
             for p in task.patches:
-                matches = _create_predicate_fn(p.predicate)
-                match = next((a for a in assets if matches(a)), None)
+                match = assets.find(p.predicate)
                 if not match:
                     logger.warning(
                         "No matching asset found for type=%s predicate=%s",
@@ -91,6 +240,8 @@ def run_tasks(
                 aid = match.get(id_key)
                 logger.info("Deleting asset of type %s with ID %s", asset_type, aid)
                 to_delete_ids.append(str(aid))
+                _record(asset_type, aid, match)
+            _flush()
 
             logger.info(
                 "Deleting batch of %d assets of type %s", len(to_delete_ids), asset_type
@@ -102,13 +253,14 @@ def run_tasks(
             )
 
         elif task.operation == "update":
-            assets = api.find_all(asset_type)
+            assets = AssetMatcher(
+                api.iter_all(asset_type), ASSET_SPECS.get(asset_type)
+            )
             logger.info("Found %d assets of type %s", len(assets), asset_type)
 
             batch_updates: List[Dict[str, Any]] = []
             for p in task.patches:
-                matches = _create_predicate_fn(p.predicate)
-                match = next((a for a in assets if matches(a)), None)
+                match = assets.find(p.predicate)
                 if not match:
                     logger.warning(
                         "No matching asset found for type=%s predicate=%s",
@@ -121,8 +273,10 @@ def run_tasks(
                 )
                 merged = {**match, **p.patch}
                 batch_updates.append(merged)
+                _record(asset_type, match.get(id_key), match)
                 logger.debug("Patched asset of type %s after=%s", asset_type, merged)
 
+            _flush()
             logger.info(
                 "Saving batch update for %d assets of type %s",
                 len(batch_updates),
@@ -139,18 +293,52 @@ def run_tasks(
         else:
             raise ValueError(f"Unsupported operation: {task.operation}")
 
-    # --- Refresh cache for affected asset types ---
+    return cache_types
 
-    logger.info(f"Refreshing cache for asset types={", ".join(cache_types)}")
-    if not dry_run:
-        try:
-            reload_cache(environment, None, list(cache_types), None)
-        except Exception as e:
-            logger.warning(
-                "Failed to refresh cache for asset types=%s: %s",
-                ", ".join(cache_types),
-                e,
-            )
-    logger.info("Cache refresh completed")
 
-    logger.info("Asset operations completed successfully")
+def rollback(
+    run_id: str,
+    *,
+    dry_run: bool = True,
+    snapshots_dir: Optional[Path] = None,
+    port: int,
+) -> None:
+    """
+    Restore every asset touched by run `run_id` to its before-image.
+
+    Assets that existed before the run are saved back, assets created by the
+    run are deleted. Each asset type is restored with a single chunked batch.
+    `port` is the local port of the bcrest port-forward.
+    """
+    header, images = read_snapshot(run_id, snapshots_dir)
+    api = BlockchainApi("localhost", port, dry_run)
+
+    logger.info(
+        "Rolling back run %s in env=%s (%d assets)",
+        run_id,
+        header.environment,
+        len(images),
+    )
+    logger.info("Dry run mode: %s", dry_run)
+
+    restores: Dict[AssetType, List[Dict[str, Any]]] = {}
+    deletes: Dict[AssetType, List[str]] = {}
+    for image in images:
+        if image.before is None:
+            deletes.setdefault(image.asset_type, []).append(image.asset_id)
+        else:
+            restores.setdefault(image.asset_type, []).append(image.before)
+
+    for asset_type, ids in deletes.items():
+        logger.info(
+            "Deleting %d assets of type %s created by the run", len(ids), asset_type
+        )
+        api.delete_batch(asset_type, ids)
+
+    for asset_type, before in restores.items():
+        logger.info("Restoring %d assets of type %s", len(before), asset_type)
+        api.save_batch(asset_type, before)
+
+    _refresh_cache(header.environment, set(restores) | set(deletes), dry_run)
+
+    logger.info("Rollback of run %s completed", run_id)
@@ -0,0 +1,134 @@
+import gzip
+import json
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from pydantic import BaseModel
+
+from app_types import AssetType, Environment
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BeforeImage(BaseModel):
+    asset_type: AssetType
+    asset_id: str
+    # None means the asset did not exist before the run (it was created by it)
+    before: Optional[Dict[str, Any]] = None
+
+
+class SnapshotHeader(BaseModel):
+    run_id: str
+    environment: Environment
+    created_at: str
+
+
+def new_run_id() -> str:
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def _resolve_snapshots_dir() -> Path:
+    """
+    Determine where before-images are stored.
+
+    Priority:
+    1) SNAPSHOTS_PATH in environment (e.g., from .env)
+    2) default to 'snapshots' in CWD
+    """
+    env_path = os.getenv("SNAPSHOTS_PATH")
+    return Path(env_path) if env_path else Path("snapshots")
+
+
+def snapshot_path(run_id: str, snapshots_dir: Optional[Path] = None) -> Path:
+    return (snapshots_dir or _resolve_snapshots_dir()) / f"{run_id}.jsonl.gz"
+
+
+def _dumps(obj: Dict[str, Any]) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+class SnapshotWriter:
+    """
+    Append-only, gzip-compressed JSON lines store of before-images for one run.
+
+    The first line is a SnapshotHeader, every following line is a BeforeImage.
+    Call `flush()` before sending the corresponding writes to the blockchain so
+    that the before-images are on disk even if the run crashes mid-way.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        environment: Environment,
+        snapshots_dir: Optional[Path] = None,
+    ) -> None:
+        self.run_id = run_id
+        self.path = snapshot_path(run_id, snapshots_dir)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+        self._fh = gzip.open(self.path, "wt", encoding="utf-8")
+        header = SnapshotHeader(
+            run_id=run_id,
+            environment=environment,
+            created_at=datetime.now().isoformat(),
+        )
+        self._fh.write(_dumps(header.model_dump()) + "\n")
+
+    def record(
+        self, asset_type: AssetType, asset_id: str, before: Optional[Dict[str, Any]]
+    ) -> None:
+        image = BeforeImage(asset_type=asset_type, asset_id=asset_id, before=before)
+        self._fh.write(_dumps(image.model_dump()) + "\n")
+        self.count += 1
+
+    def flush(self) -> None:
+        self._fh.flush()
+
+    def close(self) -> None:
+        if not self._fh.closed:
+            self._fh.close()
+            logger.info(
+                "Saved %d before-images for run %s to %s",
+                self.count,
+                self.run_id,
+                self.path,
+            )
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _iter_lines(run_id: str, snapshots_dir: Optional[Path]) -> Iterator[str]:
+    path = snapshot_path(run_id, snapshots_dir)
+    if not path.exists():
+        raise RuntimeError(f"No snapshot found for run {run_id} at: {path}")
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield line
+        except EOFError:
+            # the run crashed before closing the file; everything flushed is usable
+            logger.warning(f"Snapshot {path} is truncated, using the flushed part")
+
+
+def read_snapshot(
+    run_id: str, snapshots_dir: Optional[Path] = None
+) -> tuple[SnapshotHeader, List[BeforeImage]]:
+    """
+    Load a run's before-images, keeping only the earliest image per asset.
+    """
+    lines = _iter_lines(run_id, snapshots_dir)
+    header = SnapshotHeader.model_validate_json(next(lines))
+    images: Dict[tuple[str, str], BeforeImage] = {}
+    for line in lines:
+        image = BeforeImage.model_validate_json(line)
+        images.setdefault((image.asset_type, image.asset_id), image)
+    return header, list(images.values())
@@ -0,0 +1,179 @@
+import math
+import re
+from typing import Any, Dict, List, Tuple
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# returned when a value cannot be classified by the rules below
+UNRESOLVED = object()
+
+# explicit empties only (and pandas' "nan"); placeholders such as "NA" or "-"
+# may be real values of some fields, so they are left to the model
+_NULL_WORDS = {"", "none", "null", "nan"}
+_YES_WORDS = {"yes", "y", "true", "1", "x"}
+_NO_WORDS = {"no", "n", "false", "0"}
+# values describing a state rather than answering the field's question
+_ACTIVE_WORDS = {"active", "enabled", "on", "visible", "available"}
+_INACTIVE_WORDS = {
+    "inactive",
+    "not active",
+    "disabled",
+    "off",
+    "hidden",
+    "not available",
+    "unavailable",
+}
+# disabled, inactive, notAvailable, not_available, isNotVisible, ...
+_NEGATED_FIELD_RE = re.compile(
+    r"^(disabled|inactive|hidden|deprecated|blocked)$|^(is_?)?not(_|[A-Z])|^isNot[A-Z]"
+)
+_LIST_SEPARATORS_RE = re.compile(r"[,;|\n]")
+
+
+def _is_negated_field(name: str) -> bool:
+    return bool(_NEGATED_FIELD_RE.match(name or ""))
+
+
+def _is_null(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return True
+    return isinstance(value, str) and value.strip().lower() in _NULL_WORDS
+
+
+def _to_bool(name: str, value: Any) -> Any:
+    if isinstance(value, bool):
+        return value
+    if not isinstance(value, str):
+        return UNRESOLVED
+    word = value.strip().lower()
+    if word in _YES_WORDS:
+        return True
+    if word in _NO_WORDS:
+        return False
+    # "Active" for a field like "disabled" means the negation does not hold
+    negated = _is_negated_field(name)
+    if word in _ACTIVE_WORDS:
+        return negated is False
+    if word in _INACTIVE_WORDS:
+        return negated
+    return UNRESOLVED
+
+
+def _to_number(value: Any) -> Any:
+    if isinstance(value, bool):
+        return UNRESOLVED
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        number = value
+    elif isinstance(value, str):
+        try:
+            number = float(value.strip().replace(" ", ""))
+        except ValueError:
+            return UNRESOLVED
+    else:
+        return UNRESOLVED
+    # inf and nan are not valid JSON for the api
+    if not math.isfinite(number):
+        return UNRESOLVED
+    if isinstance(value, str) and number.is_integer():
+        return int(number)
+    return number
+
+
+def _to_library_entry(value: Any) -> Any:
+    if isinstance(value, dict) and "id" in value:
+        return value
+    if isinstance(value, str) and value.strip():
+        return {"id": value.strip()}
+    return UNRESOLVED
+
+
+def _convert_scalar(name: str, field_type: Any, value: Any) -> Any:
+    match field_type:
+        case "string":
+            return value if isinstance(value, str) else UNRESOLVED
+        case "boolean":
+            return _to_bool(name, value)
+        case "number":
+            return _to_number(value)
+        case "LibraryEntry":
+            return _to_library_entry(value)
+        case _:
+            # references to other asset types need the model
+            return UNRESOLVED
+
+
+def convert_spec_value(spec: Dict[str, Any]) -> Any:
+    """
+    Convert one asset field spec object ({name, type, value, ...}) to its
+    value using the spec's type, array_value_type and nullable flags.
+
+    Returns UNRESOLVED when the value is ambiguous (unknown words, lists
+    packed in one cell, references to other assets).
+    """
+    name = spec.get("name", "")
+    value = spec.get("value")
+
+    if "relation" in spec:
+        # left for the relation resolver, like predicate relations
+        relation = spec.get("relation") or {}
+        converted = {k: v for k, v in spec.items() if k != "value"}
+        converted["relation"] = {**relation, "predicate_field_value": value}
+        return converted
+
+    if _is_null(value):
+        if spec.get("nullable"):
+            return None
+        if spec.get("type") == "array":
+            return []
+        if spec.get("type") == "string" and isinstance(value, str):
+            return value
+        return UNRESOLVED
+
+    if spec.get("type") == "array":
+        if isinstance(value, str):
+            if _LIST_SEPARATORS_RE.search(value):
+                return UNRESOLVED
+            items = [value.strip()]
+        elif isinstance(value, list):
+            items = value
+        else:
+            return UNRESOLVED
+        item_type = spec.get("array_value_type", "string")
+        converted = [_convert_scalar(name, item_type, x) for x in items]
+        return UNRESOLVED if any(x is UNRESOLVED for x in converted) else converted
+
+    return _convert_scalar(name, spec.get("type"), value)
+
+
+def convert_patch_specs(
+    patches: List[Dict[str, Dict[str, Any]]],
+) -> Tuple[List[Dict[str, Any]], List[Tuple[int, str]]]:
+    """
+    Convert every spec object of `patches` that the rules can classify.
+
+    Returns the converted values per patch and the (patch index, key) pairs
+    left unresolved, which still hold their spec objects.
+    """
+    results: List[Dict[str, Any]] = []
+    unresolved: List[Tuple[int, str]] = []
+    for i, patch in enumerate(patches):
+        result: Dict[str, Any] = {}
+        for key, spec in patch.items():
+            value = convert_spec_value(spec)
+            if value is UNRESOLVED:
+                unresolved.append((i, key))
+                result[key] = spec
+            else:
+                result[key] = value
+        results.append(result)
+    n_fields = sum(len(p) for p in patches)
+    logger.info(
+        f"Converted {n_fields - len(unresolved)} of {n_fields} field specs locally"
+    )
+    return results, unresolved
@@ -1,142 +1,409 @@
-import subprocess
 import atexit
-from typing import Any, Callable, Dict, List, Optional, get_args
-from pydantic import BaseModel
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, get_args
 from pymongo import MongoClient
+from pymongo.collection import Collection as PyMongoCollection
+from pymongo.database import Database
 
 from app_types import AssetType, Environment
-from bc.kube_utils import switch_context
+from bc.kube_utils import (
+    PORT_FORWARD_IDLE_TTL,
+    PortForwardLease,
+    get_port_forward_pool,
+    prepare_context,
+)
 from logger import get_logger
 
-MONGO_URI = "mongodb://localhost:27017"
+MONGO_PORT = 27017
 APP_NAME = "surge-agent"
 TIMEOUT_MS = 5000
-
-_port_forward_process = None
-_client = None
+HEALTH_CHECK_INTERVAL = 30.0
+COLLECTION_NAMES_TTL = float(os.getenv("MONGO_COLLECTION_NAMES_TTL", "60"))
+FIND_BATCH_SIZE = 1000
 
 logger = get_logger(__name__)
 
+# (env, mongo namespace), e.g. ("prod", "kering")
+MongoKey = Tuple[Environment, str]
+
+
+def mongo_uri(port: int) -> str:
+    return f"mongodb://localhost:{port}"
 
-def start_port_forward(env: Environment, namespace: Optional[str] = None):
-    """
-    Launches kubectl port-forward in the background if it is not already running.
-    """
-    global _port_forward_process
 
-    if isinstance(_port_forward_process, subprocess.Popen):
-        logger.warning("Port-forward already running.")
-        return
+def default_namespace(env: Environment) -> str:
+    return "shared" if env == "dev" else "kering"
 
-    switch_context(env)
+
+def lease_port_forward(
+    env: Environment, namespace: Optional[str] = None
+) -> PortForwardLease:
+    """
+    Leases a mongo port-forward from the shared pool on a free local port.
+    """
+    prepare_context(env)
 
     if namespace is None:
-        namespace = "shared" if env == "dev" else "kering"
+        namespace = default_namespace(env)
 
     logger.info(
         f"🚀 Starting mongo port-forward for env: {env} in namespace: {namespace}..."
     )
-    cmd = [
-        "kubectl",
-        "-n",
+    lease = get_port_forward_pool().acquire(
+        env,
         f"{namespace}-{env}",
-        "port-forward",
         f"{namespace}-mongo-mongodb-0",
-        "27017:27017",
-    ]
-    logger.debug(f"Port-forward command: {' '.join(cmd)}")
-    # Run it in the background, redirect stdout and stderr so it doesn't block
-    _port_forward_process = subprocess.Popen(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        remote_port=MONGO_PORT,
     )
+    logger.info(f"Mongo available at {mongo_uri(lease.port)}")
+    return lease
+
 
-    # Register the process termination on exit
-    atexit.register(stop_port_forward)
+@dataclass
+class _MongoConnection:
+    key: MongoKey
+    lease: PortForwardLease
+    client: MongoClient
+    port: int
+    last_used: float = field(default_factory=time.monotonic)
+    last_checked: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # callers inside MongoConnectionManager.hold, never closed as idle
+    holders: int = 0
 
+    def close(self) -> None:
+        _drop_facade(self.client)
+        self.client.close()
+        self.lease.release()
 
-def stop_port_forward():
+
+class MongoConnectionManager:
     """
-    Stops the kubectl port-forward.
+    Hands out one MongoClient per (env, namespace), each bound to its own
+    pooled port-forward, so several databases can be used side by side.
+
+    Clients are pinged at most every `health_check_interval` seconds; a
+    failed ping restarts the forward and reconnects. Connections unused for
+    `idle_ttl` are closed by the port-forward pool's idle sweep, unless
+    someone holds them (see `hold`).
     """
-    global _port_forward_process
-    if (
-        isinstance(_port_forward_process, subprocess.Popen)
-        and _port_forward_process.poll() is None
-    ):
-        logger.info("🛑 Stop mongo port-forward...")
-        _port_forward_process.terminate()
+
+    def __init__(
+        self,
+        *,
+        health_check_interval: float = HEALTH_CHECK_INTERVAL,
+        idle_ttl: float = PORT_FORWARD_IDLE_TTL,
+    ) -> None:
+        self.health_check_interval = health_check_interval
+        self.idle_ttl = idle_ttl
+        self._connections: Dict[MongoKey, _MongoConnection] = {}
+        self._lock = threading.Lock()
+        # one connect at a time per key, different keys connect concurrently
+        self._connect_locks: Dict[MongoKey, threading.Lock] = {}
+        get_port_forward_pool().on_sweep(self.close_idle)
+
+    def client(self, env: Environment, namespace: Optional[str] = None) -> MongoClient:
+        return self._get((env, namespace or default_namespace(env))).client
+
+    @contextmanager
+    def hold(
+        self, env: Environment, namespace: Optional[str] = None
+    ) -> Iterator[MongoClient]:
+        """
+        Yield the client of (env, namespace) and keep the idle sweep from
+        closing it until the block exits, for callers that keep using one
+        client longer than `idle_ttl`.
+        """
+        key: MongoKey = (env, namespace or default_namespace(env))
+        while True:
+            conn = self._get(key)
+            with self._lock:
+                # the sweep may have closed it between _get and here
+                if self._connections.get(key) is conn:
+                    conn.holders += 1
+                    break
         try:
-            _port_forward_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            _port_forward_process.kill()
-        _port_forward_process = None
+            yield conn.client
+        finally:
+            with self._lock:
+                conn.holders -= 1
+                conn.last_used = time.monotonic()
 
+    def _get(self, key: MongoKey) -> _MongoConnection:
+        with self._lock:
+            conn = self._connections.get(key)
+            connect_lock = self._connect_locks.setdefault(key, threading.Lock())
+        if conn is None:
+            # connecting starts kubectl and waits for it, keep the manager unlocked
+            with connect_lock:
+                with self._lock:
+                    conn = self._connections.get(key)
+                if conn is None:
+                    conn = self._connect(key)
+                    with self._lock:
+                        self._connections[key] = conn
+        conn.last_used = time.monotonic()
+        self._check_health(conn)
+        return conn
 
-def get_client() -> MongoClient:
-    """
-    Возвращает MongoClient, при первом вызове поднимает port-forward.
-    """
-    global _client
+    def close(self, env: Environment, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            conn = self._connections.pop((env, namespace or default_namespace(env)), None)
+        if conn is not None:
+            conn.close()
 
-    if _client is None:
-        _client = MongoClient(
-            MONGO_URI, appname=APP_NAME, serverSelectionTimeoutMS=TIMEOUT_MS
+    def close_all(self) -> None:
+        with self._lock:
+            conns = list(self._connections.values())
+            self._connections.clear()
+        for conn in conns:
+            conn.close()
+
+    # ----------------- internals -----------------
+
+    def _connect(self, key: MongoKey) -> _MongoConnection:
+        lease = lease_port_forward(*key)
+        try:
+            client = self._new_client(lease.port)
+        except Exception:
+            lease.release()
+            raise
+        logger.info(f"✅ Connected to MongoDB {key[0]}/{key[1]}")
+        return _MongoConnection(key=key, lease=lease, client=client, port=lease.port)
+
+    @staticmethod
+    def _new_client(port: int) -> MongoClient:
+        client = MongoClient(
+            mongo_uri(port), appname=APP_NAME, serverSelectionTimeoutMS=TIMEOUT_MS
         )
         # Test the connection
-        _client.admin.command("ping")
-        logger.info("✅ Connected to MongoDB")
+        client.admin.command("ping")
+        return client
 
-    return _client
+    def _check_health(self, conn: _MongoConnection) -> None:
+        with conn.lock:
+            if time.monotonic() - conn.last_checked < self.health_check_interval:
+                return
+            try:
+                conn.client.admin.command("ping")
+            except Exception as e:
+                logger.warning(f"MongoDB {conn.key} ping failed ({e}), reconnecting")
+                conn.lease.ensure_alive()
+                if conn.lease.port != conn.port:
+                    _drop_facade(conn.client)
+                    conn.client.close()
+                    conn.client = self._new_client(conn.lease.port)
+                    conn.port = conn.lease.port
+            conn.last_checked = time.monotonic()
 
+    def close_idle(self) -> None:
+        """
+        Close connections nobody holds that were unused for `idle_ttl`; run
+        by the pool's idle sweep.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                c
+                for c in self._connections.values()
+                if c.holders == 0 and now - c.last_used > self.idle_ttl
+            ]
+            for conn in idle:
+                del self._connections[conn.key]
+        for conn in idle:
+            logger.info(f"Closing idle MongoDB connection {conn.key}")
+            conn.close()
+
+
+_manager = MongoConnectionManager()
+atexit.register(_manager.close_all)
+
+
+def get_connection_manager() -> MongoConnectionManager:
+    return _manager
+
+
+# per thread, so workers enriching different environments do not interfere
+_default = threading.local()
+
+
+def get_default_key() -> Optional[MongoKey]:
+    return getattr(_default, "key", None)
 
-def mongo():
-    client: MongoClient
-    try:
-        client = get_client()
-    except Exception as e:
-        logger.error("❌ Failed to connect to MongoDB:", e)
-        raise
 
-    class Collection(BaseModel):
-        find_one: Callable[[Dict], Any]
-        find_all: Callable[[Dict], List[Any]]
-        delete_many: Callable[[Dict], int]
+def start_port_forward(env: Environment, namespace: Optional[str] = None) -> None:
+    """
+    Makes (env, namespace) the default database of `get_client` / `mongo()`
+    in the calling thread, connecting through the connection manager.
+    """
+    _manager.client(env, namespace)
+    _default.key = (env, namespace or default_namespace(env))
+
+
+def stop_port_forward():
+    """
+    Clears the default database; the manager keeps the connection for reuse
+    until it has been idle.
+    """
+    _default.key = None
+
+
+def get_client(
+    env: Optional[Environment] = None, namespace: Optional[str] = None
+) -> MongoClient:
+    """
+    Возвращает MongoClient для (env, namespace)
+    (по умолчанию — выбранный через start_port_forward).
+    """
+    if env is None:
+        key = get_default_key()
+        if key is None:
+            raise RuntimeError("Mongo port-forward is not running.")
+        env, namespace = key
+    return _manager.client(env, namespace)
+
 
-    class Db(BaseModel):
-        collection: Callable[[str], Collection]
+class Collection:
+    """Thin wrapper over one pymongo collection."""
 
-    class Mongo(BaseModel):
-        db: Callable[[str], Db]
+    def __init__(self, collection: PyMongoCollection) -> None:
+        self._collection = collection
+        self.name = collection.name
 
-    def db(db_name: str):
-        db = client[db_name]
+    def find_one(
+        self, predicate: Dict = {}, projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        doc = self._collection.find_one(predicate, projection)
+        logger.info(f"find_one({predicate}) -> {doc}")
+        return doc
 
-        def collection(collection_name: str | AssetType):
-            if collection_name in get_args(AssetType):
-                collection_name = "cached_" + collection_name
-            if collection_name not in db.list_collection_names():
-                raise ValueError(
-                    f"Collection {collection_name} does not exist in DB {db_name}"
-                )
-            collection = db[collection_name]
+    def find_iter(
+        self,
+        predicate: Dict = {},
+        projection: Optional[Dict[str, Any]] = None,
+        *,
+        batch_size: int = FIND_BATCH_SIZE,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        limit: int = 0,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield matching documents straight from the cursor, `batch_size` per
+        round trip, so memory stays flat on large collections. Use
+        `projection` to fetch only the needed fields.
+        """
+        cursor = self._collection.find(
+            predicate, projection, batch_size=batch_size, sort=sort, limit=limit
+        )
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
 
-            logger.info(f"Using collection: {collection_name}")
+    def find_all(
+        self, predicate: Dict = {}, projection: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        return list(self.find_iter(predicate, projection))
 
-            def find_one(predicate={}):
-                doc = collection.find_one(predicate)
-                logger.info(f"find_one({predicate}) -> {doc}")
-                return doc
+    def count(self, predicate: Dict = {}) -> int:
+        if not predicate:
+            # from collection metadata, no scan
+            return self._collection.estimated_document_count()
+        return self._collection.count_documents(predicate)
 
-            def find_all(predicate={}):
-                return list(collection.find(predicate))
+    def delete_many(self, predicate: Dict = {}) -> int:
+        return self._collection.delete_many(predicate).deleted_count
+
+
+class Db:
+    """
+    Database facade; collection names are cached for `names_ttl` seconds
+    and Collection wrappers are reused while their name is listed.
+    """
 
-            def delete_many(predicate={}) -> int:
-                return collection.delete_many(predicate).deleted_count
+    def __init__(self, db: Database, names_ttl: float = COLLECTION_NAMES_TTL) -> None:
+        self._db = db
+        self.name = db.name
+        self.names_ttl = names_ttl
+        self._names: Set[str] = set()
+        self._names_loaded_at: Optional[float] = None
+        self._collections: Dict[str, Collection] = {}
+        self._lock = threading.Lock()
 
-            return Collection(
-                find_one=find_one, find_all=find_all, delete_many=delete_many
+    def _collection_names(self, refresh: bool = False) -> Set[str]:
+        with self._lock:
+            expired = (
+                self._names_loaded_at is None
+                or time.monotonic() - self._names_loaded_at > self.names_ttl
             )
+            if refresh or expired:
+                self._names = set(self._db.list_collection_names())
+                self._names_loaded_at = time.monotonic()
+            return self._names
 
-        return Db(collection=collection)
+    def collection(self, collection_name: str | AssetType) -> Collection:
+        if collection_name in get_args(AssetType):
+            collection_name = "cached_" + collection_name
+        # checked on every call, so a dropped collection is noticed within
+        # names_ttl; refresh once on a miss, it may have been created meanwhile
+        if collection_name not in self._collection_names() and (
+            collection_name not in self._collection_names(refresh=True)
+        ):
+            self._collections.pop(collection_name, None)
+            raise ValueError(
+                f"Collection {collection_name} does not exist in DB {self.name}"
+            )
+
+        cached = self._collections.get(collection_name)
+        if cached is not None:
+            return cached
+
+        logger.info(f"Using collection: {collection_name}")
+        collection = Collection(self._db[collection_name])
+        self._collections[collection_name] = collection
+        return collection
+
+
+class Mongo:
+    def __init__(self, client: MongoClient) -> None:
+        self.client = client
+        self._dbs: Dict[str, Db] = {}
+
+    def db(self, db_name: str) -> Db:
+        db = self._dbs.get(db_name)
+        if db is None:
+            db = Db(self.client[db_name])
+            self._dbs[db_name] = db
+        return db
+
+
+# keyed by id(client); the client is checked too since ids can be reused.
+# Entries are dropped when the manager closes their client.
+_facades: Dict[int, Mongo] = {}
+_facades_lock = threading.Lock()
+
+
+def _drop_facade(client: MongoClient) -> None:
+    with _facades_lock:
+        facade = _facades.get(id(client))
+        if facade is not None and facade.client is client:
+            del _facades[id(client)]
+
+
+def mongo(env: Optional[Environment] = None, namespace: Optional[str] = None) -> Mongo:
+    client: MongoClient
+    try:
+        client = get_client(env, namespace)
+    except Exception as e:
+        logger.error("❌ Failed to connect to MongoDB:", e)
+        raise
 
-    return Mongo(db=db)
+    with _facades_lock:
+        facade = _facades.get(id(client))
+        if facade is None or facade.client is not client:
+            facade = Mongo(client)
+            _facades[id(client)] = facade
+        return facade
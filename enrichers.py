@@ -1,9 +1,10 @@
-from typing import Callable, Dict, Tuple, Optional
-from app_types import AssetType, Operation, AssetPatch
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Tuple, Optional
+from app_types import AssetType, Environment, Operation, AssetPatch
 from datetime import datetime
-from db import mongo
 from logger import get_logger
 import re
+from org_index import find_organizations_by_vat
 
 logger = get_logger(__name__)
 
@@ -82,18 +83,49 @@ def _enrich_sulplier_library_entry(patch: Dict):
         patch["sapCode"] = None
 
 
+@dataclass
+class EnrichmentContext:
+    """
+    Environment a batch of patches is enriched for; env None means the
+    database selected with db.start_port_forward.
+    """
+
+    env: Optional[Environment] = None
+    namespace: Optional[str] = None
+
+
+# enriches all patches of one environment in place
+BatchEnricher = Callable[[List[AssetPatch], EnrichmentContext], None]
+
+
+def per_patch(enrich: Callable[[AssetPatch], None]) -> BatchEnricher:
+    """Adapt a single-patch enricher to the batch interface."""
+
+    def enrich_all(asset_patches: List[AssetPatch], ctx: EnrichmentContext) -> None:
+        for i, p in enumerate(asset_patches):
+            enrich(p)
+            logger.debug(f"Enriched patch {i}")
+
+    return enrich_all
+
+
+def find_organization_ids_by_vat(
+    vat_codes: Iterable[str], ctx: Optional[EnrichmentContext] = None
+) -> Dict[str, str]:
+    """
+    Resolve many VAT codes to organization ids from the organization index.
+    Raises ValueError listing every code that has no organization.
+    """
+    ctx = ctx or EnrichmentContext()
+    orgs = find_organizations_by_vat(vat_codes, ctx.env, ctx.namespace)
+    ids = {vat: org.company_id for vat, org in orgs.items()}
+    if ids:
+        logger.info(f"Found organizations for {len(ids)} vatCodes: {ids}")
+    return ids
+
+
 def find_organization_id_by_vat(vat_code: str) -> str:
-    org = (
-        mongo()
-        .db("kering")
-        .collection("cached_Organization")
-        .find_one({"attributes.vatCode": vat_code})
-    )
-    if org is None:
-        raise ValueError(f"Organization with vatCode={vat_code} not found")
-    else:
-        logger.info(f"Found organization {org['companyId']} for vatCode={vat_code}")
-    return org["companyId"]
+    return find_organization_ids_by_vat([vat_code])[vat_code]
 
 
 def encrich_supplier_library_entry_deprecation(
@@ -133,14 +165,28 @@ def organization_create(asset_patch: AssetPatch):
         if "sapCode" in attributes and attributes["sapCode"] == "":
             attributes["sapCode"] = None
 
+def _manufacturer_vat_code(asset_patch: AssetPatch) -> Optional[str]:
+    manufacturerId = asset_patch.predicate.get("manufacturerId")
+    if isinstance(manufacturerId, dict) and "relation" in manufacturerId:
+        return manufacturerId["relation"].get("predicate_field_value", None)
+    return None
+
+
+def enrich_eyewear_manufacturer_assignment_delete_all(
+    asset_patches: List[AssetPatch], ctx: EnrichmentContext
+):
+    pending = [
+        (p, vat) for p in asset_patches if (vat := _manufacturer_vat_code(p)) is not None
+    ]
+    ids = find_organization_ids_by_vat((vat for _, vat in pending), ctx)
+    for p, vat in pending:
+        p.predicate["manufacturerId"] = ids[vat]
+
+
 def enrich_eyewear_manufacturer_assignment_delete(asset_patch: AssetPatch):
-    predicate = asset_patch.predicate
-    if "manufacturerId" in predicate:
-        manufacturerId = predicate["manufacturerId"]
-        if isinstance(manufacturerId, dict) and "relation" in manufacturerId:
-            vatCode = manufacturerId["relation"].get("predicate_field_value", None)
-            if vatCode is not None:
-                predicate["manufacturerId"] = find_organization_id_by_vat(vatCode)
+    enrich_eyewear_manufacturer_assignment_delete_all(
+        [asset_patch], EnrichmentContext()
+    )
 
 
 ENRICHERS: Dict[Tuple[AssetType, Operation], Callable] = {
@@ -149,3 +195,44 @@ ENRICHERS: Dict[Tuple[AssetType, Operation], Callable] = {
     ("Organization", "create"): organization_create,
     ("EyewearManufacturerAssignment", "delete"): enrich_eyewear_manufacturer_assignment_delete,
 }
+
+@dataclass(frozen=True)
+class Enricher:
+    """
+    `pure` does not depend on the environment and runs once on the patches
+    before they are copied per environment; `env_bound` runs per environment.
+    """
+
+    pure: Optional[Callable[[List[AssetPatch]], None]] = None
+    env_bound: Optional[BatchEnricher] = None
+
+    @property
+    def needs_environment(self) -> bool:
+        return self.env_bound is not None
+
+
+def _pure(enrich: Callable[[AssetPatch], None]) -> Callable[[List[AssetPatch]], None]:
+    def enrich_all(asset_patches: List[AssetPatch]) -> None:
+        for p in asset_patches:
+            enrich(p)
+
+    return enrich_all
+
+
+# per-patch ENRICHERS not listed here are run per environment through `per_patch`
+BATCH_ENRICHERS: Dict[Tuple[AssetType, Operation], Enricher] = {
+    ("SupplierLibraryEntry", "create"): Enricher(
+        pure=_pure(encrich_supplier_library_entry_create)
+    ),
+    ("Organization", "create"): Enricher(pure=_pure(organization_create)),
+    ("EyewearManufacturerAssignment", "delete"): Enricher(
+        env_bound=enrich_eyewear_manufacturer_assignment_delete_all
+    ),
+}
+
+
+def get_enricher(key: Tuple[AssetType, Operation]) -> Optional[Enricher]:
+    enricher = BATCH_ENRICHERS.get(key)
+    if enricher is None and key in ENRICHERS:
+        enricher = Enricher(env_bound=per_patch(ENRICHERS[key]))
+    return enricher
@@ -66,7 +66,7 @@ if __name__ == "__main__":
     handle: PortForwardHandle
     try:
         handle = start_port_forwarding(env)
-        run_tasks(environment=env, tasks=[task], dry_run=True)
+        run_tasks(environment=env, tasks=[task], dry_run=True, port=handle.port)
     except Exception as e:
         logger.error(f"Error executing tasks in environment {env}: {e}")
     finally:
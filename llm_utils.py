@@ -1,3 +1,6 @@
+import math
+import os
+import threading
 import time
 import openai
 import random
@@ -21,6 +24,11 @@ from langchain_core.messages import (
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel
 
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a length estimate
+    tiktoken = None
+
 from logger import get_logger
 
 import json
@@ -32,6 +40,16 @@ from langchain_core.messages import AIMessage, ToolMessage
 logger = get_logger(__name__)
 
 
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+# shared by all threads of the process, 0 disables the limit
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "120"))
+
+# prompt tokens of one batch conversion request, system prompts included
+# (callers take those off before chunking); the answer is about as long
+# as the chunk and has to fit the model's output limit (16k for gpt-4o)
+CHUNK_TOKEN_BUDGETS: Dict[str, int] = {"gpt-4o": 6000, "gpt-4o-mini": 6000}
+DEFAULT_CHUNK_TOKEN_BUDGET = 4000
+
 T = TypeVar("T")
 InputT = TypeVar("InputT")
 OutputT = TypeVar("OutputT")
@@ -49,6 +67,104 @@ def _sleep_backoff(attempt: int, base: float = 0.5, cap: float = 8.0):
     time.sleep(random.uniform(0, delay))
 
 
+class RateLimiter:
+    """
+    Spaces calls evenly so that at most `requests_per_minute` start per
+    minute, across all threads sharing the limiter.
+    """
+
+    def __init__(self, requests_per_minute: float) -> None:
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.interval == 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+_rate_limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE)
+
+
+def get_rate_limiter() -> RateLimiter:
+    return _rate_limiter
+
+
+def chunk_token_budget(model: str) -> int:
+    budget = os.getenv("LLM_CHUNK_TOKEN_BUDGET")
+    if budget:
+        return int(budget)
+    return CHUNK_TOKEN_BUDGETS.get(model, DEFAULT_CHUNK_TOKEN_BUDGET)
+
+
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding(model: str) -> Any:
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # the encoding files are downloaded on first use
+            logger.warning(f"tiktoken encoding for {model} not available ({e})")
+            _encodings[model] = None
+    return _encodings[model]
+
+
+def estimate_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Token count of `text` with tiktoken, or about 4 characters per token."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def chunk_by_tokens(items: List[T], sizes: List[int], budget: int) -> List[List[T]]:
+    """
+    Split `items` in order into the fewest chunks of at most `budget` tokens
+    (`sizes` are the items' token counts), balanced to about the same size.
+    An item larger than the budget gets a chunk of its own.
+    """
+    if not items:
+        return []
+    remaining = sum(sizes)
+
+    def _target() -> float:
+        # spread what is left evenly over the fewest chunks that can hold it
+        return remaining / max(1, math.ceil(remaining / budget))
+
+    target = _target()
+    chunks: List[List[T]] = []
+    current: List[T] = []
+    current_tokens = 0
+    for item, size in zip(items, sizes):
+        # close the chunk when the item would overflow it or lies mostly past the target
+        if current and (
+            current_tokens + size > budget or current_tokens + size / 2 > target
+        ):
+            chunks.append(current)
+            remaining -= current_tokens
+            target = _target()
+            current, current_tokens = [], 0
+        if size > budget:
+            logger.warning(f"Item of {size} tokens exceeds the chunk budget of {budget}")
+        current.append(item)
+        current_tokens += size
+    chunks.append(current)
+    return chunks
+
+
 def retry_call(
     runnable: Runnable[InputT, OutputT], *, max_attempts: int = 3
 ) -> Runnable[InputT, OutputT]:
@@ -87,13 +203,19 @@ def call_with_self_heal(
     *,
     max_transient_attempts: int = 3,
     max_repairs: int = 3,
+    rate_limiter: Optional[RateLimiter] = None,
 ) -> R:
     struct_llm = llm.with_structured_output(schema_model, method="json_mode")
 
+    def _invoke(msgs: List[BaseMessage]) -> Any:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return struct_llm.invoke(msgs)
+
     attempt = 1
     while attempt <= max_transient_attempts:
         try:
-            raw = struct_llm.invoke([SystemMessage(content=STRICT_JSON), *messages])
+            raw = _invoke([SystemMessage(content=STRICT_JSON), *messages])
             return schema_model.model_validate(raw)
         except Exception as e:
             if _is_transient_error(e) and attempt < max_transient_attempts:
@@ -119,7 +241,7 @@ def call_with_self_heal(
                     logger.debug(
                         f"Repairing with messages:\n```json\n{json.dumps([{'type': type(m).__name__, 'content': m.content} for m in repair_msgs], indent=2)}\n```"
                     )
-                    raw = struct_llm.invoke(repair_msgs)
+                    raw = _invoke(repair_msgs)
                     logger.debug(
                         f"Repaired candidate:\n```log\n{raw}\n```"
                     )
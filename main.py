@@ -1,4 +1,4 @@
-from typing import Any, Literal, Optional
+from typing import Any, List, Literal, Optional
 from uuid import UUID
 from dotenv import load_dotenv
 from langchain_core.callbacks import BaseCallbackHandler
@@ -15,12 +15,13 @@ from langchain.prompts import ChatPromptTemplate
 import json
 from datetime import datetime
 
+from bc.kube_logs import aggregate_logs, stream_logs
+from bc.log_store import get_log_store
 from bc.kube_utils import (
     NAMESPACES_BY_ENV,
     Namespace,
     PortForwardHandle,
     find_pod_name_fuzzy,
-    get_logs,
     start_port_forwarding,
     stop_port_forwarding,
 )
@@ -59,6 +60,7 @@ from nodes.supplier_library_entry_creation_node import (
 )
 from nodes.delete_organization_by_id_node import delete_organization_by_id_node
 from nodes.task_creation_node import task_creation_node
+from operation_helpers import rollback_with_port_forwarding
 from tasks import tasks
 
 load_dotenv()
@@ -271,6 +273,9 @@ def process_text(user_input: str) -> str:
     return "done"
 
 
+DEFAULT_LOG_TAIL = 500
+
+
 @tool
 def show_logs(
     fuzzy_pod_name: str,
@@ -278,11 +283,41 @@ def show_logs(
     ns: Namespace,
     *,
     since_time: Optional[str],  # ISO format string
+    until_time: Optional[str] = None,  # ISO format string
+    tail: Optional[int] = None,
+    pattern: Optional[str] = None,
+    levels: Optional[List[str]] = None,
+    all_replicas: bool = False,
+    all_namespaces: bool = False,
 ) -> str:
     """
     Fetch and display logs from a specified pod in the given environment.
     The pod name can be a fuzzy match. It is not necessary to provide the full pod name.
+    Optionally limit the output to the last `tail` lines, to lines matching the
+    regex `pattern`, or to the given log `levels` (e.g. ["ERROR", "WARN"]).
+    With `all_replicas` the logs of every matching pod are merged by time;
+    `all_namespaces` also searches every namespace of the environment.
     """
+    if tail is None and since_time is None:
+        tail = DEFAULT_LOG_TAIL
+    if all_replicas or all_namespaces:
+        namespaces = NAMESPACES_BY_ENV[env] if all_namespaces else [ns]
+        try:
+            for line in aggregate_logs(
+                fuzzy_pod_name,
+                env,
+                namespaces,
+                tail=tail,
+                since_time=since_time,
+                until_time=until_time,
+                pattern=pattern,
+                levels=levels,
+            ):
+                print(line.labeled())
+        except Exception as e:
+            logger.error(f"Error fetching logs: {e}")
+        return "done"
+
     try:
         pod_name = find_pod_name_fuzzy(fuzzy_pod_name, env, ns)
         logger.debug(f"Found pod name: {pod_name}")
@@ -292,13 +327,82 @@ def show_logs(
     if pod_name:
         try:
             logger.debug(f"Fetching logs for pod '{pod_name}' in {env}/{ns}")
-            logs = get_logs(pod_name, env, ns, since_time=since_time)
-            print(logs)
+            if since_time is not None and tail is None:
+                # time-bounded questions are answered from the local store,
+                # downloading only the part of the window not seen before
+                lines = get_log_store().logs(
+                    env,
+                    ns,
+                    pod_name,
+                    since_time=since_time,
+                    until_time=until_time,
+                    pattern=pattern,
+                    levels=levels,
+                )
+            else:
+                lines = stream_logs(
+                    pod_name,
+                    env,
+                    ns,
+                    tail=tail,
+                    since_time=since_time,
+                    until_time=until_time,
+                    pattern=pattern,
+                    levels=levels,
+                )
+            for line in lines:
+                print(line)
         except Exception as e:
             logger.error(f"Error fetching logs: {e}")
     return "done"
 
 
+DEFAULT_SEARCH_LIMIT = 200
+
+
+@tool
+def search_logs(
+    text: str,
+    env: Environment,
+    ns: Namespace,
+    *,
+    fuzzy_pod_name: Optional[str] = None,
+    since_time: Optional[str] = None,  # ISO format string
+    until_time: Optional[str] = None,  # ISO format string
+    levels: Optional[List[str]] = None,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+) -> str:
+    """
+    Full-text search over logs already downloaded by show_logs (e.g. text="timeout",
+    'timeout OR "connection reset"'; other text is matched as a phrase).
+    If fuzzy_pod_name and since_time are given,
+    the missing part of that window is downloaded first.
+    """
+    store = get_log_store()
+    pod_name = None
+    try:
+        if fuzzy_pod_name:
+            pod_name = find_pod_name_fuzzy(fuzzy_pod_name, env, ns)
+            if pod_name and since_time is not None:
+                store.fetch(
+                    env, ns, pod_name, since_time=since_time, until_time=until_time
+                )
+        for line in store.query(
+            env,
+            ns,
+            pod_name,
+            since_time=since_time,
+            until_time=until_time,
+            text=text,
+            levels=levels,
+            limit=limit,
+        ):
+            print(line.labeled())
+    except Exception as e:
+        logger.error(f"Error searching logs: {e}")
+    return "done"
+
+
 @tool
 def get_time() -> str:
     """
@@ -318,9 +422,9 @@ def start_bcrest_port_forwarding(env: Environment, ns: Namespace) -> str:
     global handle
     if handle is None:
         handle = start_port_forwarding(env, namespace=ns)
-        return f"Port forwarding started for {env}."
+        return f"Port forwarding started for {env}: bcrest api at http://localhost:{handle.port}."
     else:
-        return "Port forwarding is already running."
+        return f"Port forwarding is already running on port {handle.port}."
 
 
 @tool
@@ -332,20 +436,36 @@ def stop_bcrest_port_forwarding():
     if handle is not None:
         env = handle.env
         ns = handle.ns
-        stop_port_forwarding(handle)
+        stop_port_forwarding(handle, force=True)
         handle = None
         return f"Port forwarding stopped for {env}/{ns}."
     else:
         return "Port forwarding is not running."
 
 
+@tool
+def rollback_run(run_id: str, dry_run: bool = True) -> str:
+    """
+    Reverts all asset changes made by a previous task run, identified by its run id.
+    dry_run can only be false if the user explicitly asks to apply the rollback.
+    """
+    try:
+        rollback_with_port_forwarding(run_id, dry_run=dry_run)
+    except Exception as e:
+        logger.error(f"Error rolling back run {run_id}: {e}")
+        return f"Rollback of run {run_id} failed: {e}"
+    return f"Rollback of run {run_id} done (dry_run={dry_run})."
+
+
 TOOLS = [
     process_github_issue,
     process_text,
     show_logs,
+    search_logs,
     get_time,
     start_bcrest_port_forwarding,
     stop_bcrest_port_forwarding,
+    rollback_run,
 ]
 
 
@@ -366,7 +486,7 @@ You know the following environments and their corresponding namespaces:
 When use tools pass the correct environment and namespace parameters from the above list.
 You must choose the most appropriate namespace or environment from the above list.
 If the namespace is not provided, you must choose the most appropriate namespace from the above list.
-If time period is specified, like "last 10 minutes", "last hour", "today", "yesterday", "last 2 days", "last week", you must calculate the since_time and to_time parameters based on the current time.
+If time period is specified, like "last 10 minutes", "last hour", "today", "yesterday", "last 2 days", "last week", you must calculate the since_time and until_time parameters based on the current time.
 You can get the current time by using the get_time tool.
 There is 2 hours time difference between my local time (CEST) and the kube cluster.
 For example if it is 3pm CEST, it is 1pm in the kube cluster.
@@ -0,0 +1,270 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from pydantic import BaseModel
+
+from app_types import AssetSpec, AssetType, Operation
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS asset_mappings (
+    key TEXT PRIMARY KEY,
+    asset_type TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    spec_hash TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    mapping TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    last_used_at TEXT,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS asset_mappings_type ON asset_mappings (asset_type, operation);
+"""
+
+
+class MappingCacheEntry(BaseModel):
+    key: str
+    asset_type: AssetType
+    operation: Operation
+    spec_hash: str
+    headers: List[str]
+    mapping: Dict[str, Any]
+    created_at: str
+    last_used_at: Optional[str] = None
+    hits: int = 0
+
+
+def _resolve_cache_path() -> Path:
+    """
+    Determine the mapping cache location.
+
+    Priority:
+    1) MAPPING_CACHE_PATH in environment (e.g., from .env)
+    2) default to 'mapping_cache.sqlite3' in CWD
+    """
+    env_path = os.getenv("MAPPING_CACHE_PATH")
+    return Path(env_path) if env_path else Path("mapping_cache.sqlite3")
+
+
+def normalize_header(header: str) -> str:
+    # " New  Supplier Type" -> "new supplier type"
+    return re.sub(r"\s+", " ", header).strip().lower()
+
+
+def spec_hash(asset_spec: AssetSpec) -> str:
+    dumped = json.dumps(asset_spec.model_dump(exclude_none=True), sort_keys=True)
+    return hashlib.sha256(dumped.encode()).hexdigest()[:16]
+
+
+def mapping_key(
+    asset_type: AssetType,
+    operation: Operation,
+    asset_spec: AssetSpec,
+    headers: Iterable[str],
+) -> str:
+    signature = sorted({normalize_header(h) for h in headers})
+    payload = json.dumps(
+        [asset_type, operation, spec_hash(asset_spec), signature], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def _rename_inputs(mapping: Dict[str, Any], headers: Iterable[str]) -> Dict[str, Any]:
+    """
+    Point the input field names of a cached mapping at this file's headers,
+    which may differ from the cached ones in case or spacing.
+    """
+    by_norm = {normalize_header(h): h for h in headers}
+    return {
+        part: [[by_norm.get(normalize_header(i), i), o] for i, o in pairs]
+        for part, pairs in mapping.items()
+    }
+
+
+class MappingCache:
+    """
+    Persistent SQLite cache of asset mappings (input columns -> AssetSpec
+    fields), keyed by asset type, operation, AssetSpec hash and the
+    normalized set of input headers, so a recurring template is mapped once.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path or _resolve_cache_path()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(
+        self,
+        asset_type: AssetType,
+        operation: Operation,
+        asset_spec: AssetSpec,
+        headers: List[str],
+    ) -> Optional[Dict[str, Any]]:
+        key = mapping_key(asset_type, operation, asset_spec, headers)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mapping FROM asset_mappings WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE asset_mappings SET hits = hits + 1, last_used_at=? WHERE key=?",
+                (datetime.now().isoformat(timespec="seconds"), key),
+            )
+            self._conn.commit()
+        logger.info(f"Asset mapping for {asset_type} {operation} found in cache ({key})")
+        return _rename_inputs(json.loads(row[0]), headers)
+
+    def put(
+        self,
+        asset_type: AssetType,
+        operation: Operation,
+        asset_spec: AssetSpec,
+        headers: List[str],
+        mapping: Dict[str, Any],
+    ) -> str:
+        key = mapping_key(asset_type, operation, asset_spec, headers)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO asset_mappings "
+                "(key, asset_type, operation, spec_hash, headers, mapping, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    asset_type,
+                    operation,
+                    spec_hash(asset_spec),
+                    json.dumps(sorted(headers), ensure_ascii=False),
+                    json.dumps(mapping, ensure_ascii=False),
+                    datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+            self._conn.commit()
+        logger.info(f"Asset mapping for {asset_type} {operation} cached ({key})")
+        return key
+
+    def entries(
+        self, asset_type: Optional[str] = None, operation: Optional[str] = None
+    ) -> List[MappingCacheEntry]:
+        sql = "SELECT key, asset_type, operation, spec_hash, headers, mapping, created_at, last_used_at, hits FROM asset_mappings"
+        where: List[str] = []
+        params: List[str] = []
+        if asset_type is not None:
+            where.append("asset_type = ?")
+            params.append(asset_type)
+        if operation is not None:
+            where.append("operation = ?")
+            params.append(operation)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            MappingCacheEntry(
+                key=r[0],
+                asset_type=r[1],
+                operation=r[2],
+                spec_hash=r[3],
+                headers=json.loads(r[4]),
+                mapping=json.loads(r[5]),
+                created_at=r[6],
+                last_used_at=r[7],
+                hits=r[8],
+            )
+            for r in rows
+        ]
+
+    def invalidate(
+        self,
+        key: Optional[str] = None,
+        *,
+        asset_type: Optional[str] = None,
+        operation: Optional[str] = None,
+    ) -> int:
+        """Delete one entry by key (prefix), or all entries matching the filters."""
+        sql = "DELETE FROM asset_mappings"
+        where: List[str] = []
+        params: List[str] = []
+        if key is not None:
+            where.append("key LIKE ?")
+            params.append(key + "%")
+        if asset_type is not None:
+            where.append("asset_type = ?")
+            params.append(asset_type)
+        if operation is not None:
+            where.append("operation = ?")
+            params.append(operation)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cur.rowcount
+
+
+_cache: Optional[MappingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_mapping_cache() -> MappingCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MappingCache()
+        return _cache
+
+
+def _main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect the asset mapping cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ls = sub.add_parser("list", help="list cached mappings")
+    show = sub.add_parser("show", help="print one mapping")
+    show.add_argument("key", help="entry key or a unique prefix of it")
+    rm = sub.add_parser("invalidate", help="delete cached mappings")
+    rm.add_argument("key", nargs="?", help="entry key or prefix (default: all)")
+    for p in (ls, rm):
+        p.add_argument("--asset-type")
+        p.add_argument("--operation")
+
+    args = parser.parse_args(argv)
+    cache = get_mapping_cache()
+
+    match args.command:
+        case "list":
+            for e in cache.entries(args.asset_type, args.operation):
+                print(
+                    f"{e.key}  {e.asset_type:<28} {e.operation:<7} hits={e.hits:<4} "
+                    f"created={e.created_at}  headers={', '.join(e.headers)}"
+                )
+        case "show":
+            matches = [e for e in cache.entries() if e.key.startswith(args.key)]
+            if len(matches) != 1:
+                parser.error(f"{len(matches)} entries match '{args.key}'")
+            print(matches[0].model_dump_json(indent=2))
+        case "invalidate":
+            n = cache.invalidate(
+                args.key, asset_type=args.asset_type, operation=args.operation
+            )
+            print(f"Deleted {n} cached mappings")
+
+
+if __name__ == "__main__":
+    _main()
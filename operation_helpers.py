@@ -1,5 +1,8 @@
+import copy
 import json
-from typing import Any, Dict, List, Sequence, Tuple, TypeVar
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TypeVar
 
 from langchain_core.messages import (
     HumanMessage,
@@ -20,15 +23,35 @@ from app_types import (
 )
 from asset_spec import ASSET_SPECS
 from bc.kube_utils import PortForwardHandle, start_port_forwarding, stop_port_forwarding
-from bc.run_tasks import run_tasks
+from bc.run_tasks import rollback, run_tasks
+from bc.snapshots import read_snapshot
+from converters import convert_patch_specs
 from db import start_port_forward, stop_port_forward
-from enrichers import ENRICHERS
+from enrichers import EnrichmentContext, get_enricher
 from logger import get_logger
-from llm_utils import call_with_self_heal
-import numpy as np
+from mapping_cache import get_mapping_cache, mapping_key
+from llm_utils import (
+    LLM_CONCURRENCY,
+    STRICT_JSON,
+    call_with_self_heal,
+    chunk_by_tokens,
+    chunk_token_budget,
+    estimate_tokens,
+    get_rate_limiter,
+)
+
+try:
+    from langchain_core.callbacks import UsageMetadataCallbackHandler
+except ImportError:  # langchain-core < 0.3.49
+    UsageMetadataCallbackHandler = None
 
 logger = get_logger(__name__)
 
+# whole-chunk retries after call_with_self_heal gave up on its repairs
+CHUNK_ATTEMPTS = 2
+# re-check cached asset mappings against the spec and the input before use
+MAPPING_CACHE_REVALIDATE = os.getenv("MAPPING_CACHE_REVALIDATE", "1") != "0"
+
 PatchFieldMapping = Tuple[str, str | AssetFieldSpec]
 
 
@@ -64,12 +87,100 @@ def in_fields(f: str | AssetFieldSpec, fields: List[str | AssetFieldSpec]) -> bo
     return False
 
 
+def _validate_mapping(
+    predicate: List[PatchFieldMapping],
+    patch: List[PatchFieldMapping],
+    *,
+    asset_spec: AssetSpec,
+    example: Dict[str, str],
+    operation_name: Operation,
+) -> None:
+    """Raise ValueError if the mapping does not fit the spec and the input."""
+    input_fields = example.keys()
+    patch_input_fields = [x[0] for x in patch]
+    output_fields = [f for f in asset_spec.fields.values()]
+    predicate_output_fields = [x[1] for x in predicate]
+    patch_output_fields = [x[1] for x in patch]
+
+    logger.debug(
+        f"Asset spec fields:\n```json\n{asset_spec.model_dump_json(indent=2)}\n```"
+    )
+
+    if operation_name == "create":
+        output_field_names = [
+            str(f["name"]) if isinstance(f, dict) and "name" in f else str(f)
+            for f in output_fields
+        ]
+        for required_field in asset_spec.create_required_fields:
+            if required_field not in output_field_names:
+                raise ValueError(
+                    f"Required field '{required_field}' not found in spec fields:\n```log\n{output_field_names}\n```"
+                )
+
+    for f in predicate_output_fields:
+        if not in_fields(f, output_fields):
+            raise ValueError(
+                f"Predicate output field '{f}' not found in spec fields:\n```log\n{output_fields}\n```"
+            )
+    for f in patch_output_fields:
+        if not in_fields(f, output_fields):
+            raise ValueError(
+                f"Patch output field '{f}' not found in spec fields:\n```log\n{output_fields}\n```"
+            )
+    for f in patch_input_fields:
+        if f not in input_fields:
+            raise ValueError(
+                f"Patch input field '{f}' not found in example input fields"
+            )
+
+
+def _cached_asset_mapping(
+    asset_type: AssetType,
+    asset_spec: AssetSpec,
+    example: Dict[str, str],
+    operation_name: Operation,
+) -> Optional[AssetMapping]:
+    cache = get_mapping_cache()
+    headers = list(example.keys())
+    cached = cache.get(asset_type, operation_name, asset_spec, headers)
+    if cached is None:
+        return None
+    try:
+        mapping = AssetMapping.model_validate(cached)
+        if MAPPING_CACHE_REVALIDATE:
+            _validate_mapping(
+                mapping.predicate,
+                mapping.patch,
+                asset_spec=asset_spec,
+                example=example,
+                operation_name=operation_name,
+            )
+    except ValueError as e:
+        logger.warning(f"Cached asset mapping is no longer valid, remapping: {e}")
+        cache.invalidate(
+            mapping_key(asset_type, operation_name, asset_spec, headers)
+        )
+        return None
+    return mapping
+
+
 def _create_asset_mapping(
     llm: ChatOpenAI,
     asset_spec: AssetSpec,
     example: Dict[str, str],
     operation_name: Operation,
+    *,
+    asset_type: Optional[AssetType] = None,
 ) -> AssetMapping:
+    """
+    Map the input columns to AssetSpec fields with the LLM. With
+    `asset_type`, mappings are reused from (and saved to) the mapping cache.
+    """
+    if asset_type is not None:
+        cached = _cached_asset_mapping(asset_type, asset_spec, example, operation_name)
+        if cached is not None:
+            return cached
+
     system_prompt = """
 You will be given:
 
@@ -140,45 +251,13 @@ Return a JSON object in the form:
 
         @model_validator(mode="after")
         def _validate_mapping(self):
-            predicate = self.predicate
-            patch = self.patch
-
-            input_fields = example.keys()
-            patch_input_fields = [x[0] for x in patch]
-            output_fields = [f for f in asset_spec.fields.values()]
-            predicate_output_fields = [x[1] for x in predicate]
-            patch_output_fields = [x[1] for x in patch]
-
-            logger.debug(
-                f"Asset spec fields:\n```json\n{asset_spec.model_dump_json(indent=2)}\n```"
+            _validate_mapping(
+                self.predicate,
+                self.patch,
+                asset_spec=asset_spec,
+                example=example,
+                operation_name=operation_name,
             )
-
-            if operation_name == "create":
-                output_field_names = [
-                    str(f["name"]) if isinstance(f, dict) and "name" in f else str(f)
-                    for f in output_fields
-                ]
-                for required_field in asset_spec.create_required_fields:
-                    if required_field not in output_field_names:
-                        raise ValueError(
-                            f"Required field '{required_field}' not found in spec fields:\n```log\n{output_field_names}\n```"
-                        )
-
-            for f in predicate_output_fields:
-                if not in_fields(f, output_fields):
-                    raise ValueError(
-                        f"Predicate output field '{f}' not found in spec fields:\n```log\n{output_fields}\n```"
-                    )
-            for f in patch_output_fields:
-                if not in_fields(f, output_fields):
-                    raise ValueError(
-                        f"Patch output field '{f}' not found in spec fields:\n```log\n{output_fields}\n```"
-                    )
-            for f in patch_input_fields:
-                if f not in input_fields:
-                    raise ValueError(
-                        f"Patch input field '{f}' not found in example input fields"
-                    )
             return self
 
     response = call_with_self_heal(llm, messages, Response)
@@ -187,7 +266,16 @@ Return a JSON object in the form:
         f"Asset mapping response:\n```json\n{response.model_dump_json(indent=2)}\n```"
     )
 
-    return AssetMapping.model_validate(response.model_dump())
+    mapping = AssetMapping.model_validate(response.model_dump())
+    if asset_type is not None:
+        get_mapping_cache().put(
+            asset_type,
+            operation_name,
+            asset_spec,
+            list(example.keys()),
+            mapping.model_dump(mode="json"),
+        )
+    return mapping
 
 
 def _identify_updatable_fields(llm: ChatOpenAI, task_description: str) -> List[str]:
@@ -263,7 +351,50 @@ def _run_mapping_with_specs(
     return [item_to_patch(x) for x in input_data]
 
 
+def _spec_key(key: str, spec: Dict[str, Any]) -> str:
+    # the same field with the same spec object converts to the same value
+    return json.dumps([key, spec], sort_keys=True, ensure_ascii=False, default=str)
+
+
 def _resolve_patch_specs(llm: ChatOpenAI, patches: List[dict]) -> List[dict]:
+    """
+    Convert asset field spec objects to values: by rules where the spec's
+    type makes the value unambiguous (see converters), by the LLM otherwise.
+
+    Each distinct (field, spec object) is converted once and the value is
+    copied to every patch holding it, so repeated columns cost one
+    conversion instead of one per row.
+    """
+    unique: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    for patch in patches:
+        for key, spec in patch.items():
+            unique.setdefault(_spec_key(key, spec), (key, spec))
+    n_fields = sum(len(p) for p in patches)
+    logger.info(f"Resolving {len(unique)} distinct field specs of {n_fields}")
+
+    spec_keys = list(unique)
+    converted, unresolved = convert_patch_specs(
+        [{unique[k][0]: unique[k][1]} for k in spec_keys]
+    )
+    if unresolved:
+        # send only the distinct specs the rules could not classify
+        llm_results = _llm_resolve_patch_specs(
+            llm, [{key: converted[i][key]} for i, key in unresolved]
+        )
+        for (i, key), resolved in zip(unresolved, llm_results):
+            converted[i][key] = resolved[key]
+
+    values = {k: converted[i][unique[k][0]] for i, k in enumerate(spec_keys)}
+    return [
+        {key: copy.deepcopy(values[_spec_key(key, spec)]) for key, spec in patch.items()}
+        for patch in patches
+    ]
+
+
+_PATCH_SPECS_PREFIX = "Please convert the following patch:\n"
+
+
+def _llm_resolve_patch_specs(llm: ChatOpenAI, patches: List[dict]) -> List[dict]:
     system_prompt = """
 You will be given a **list of patch objects**.  
 
@@ -350,14 +481,42 @@ Return the result in the following structure:
   ]
 }
 """
-    smart_llm = ChatOpenAI(model="gpt-4o", temperature=0)
+    model = "gpt-4o"
+    usage = UsageMetadataCallbackHandler() if UsageMetadataCallbackHandler else None
+    smart_llm = ChatOpenAI(
+        model=model, temperature=0, callbacks=[usage] if usage else None
+    )
 
     n_patches = len(patches)
-    resolved_values = []
-    chunks = np.array_split(np.asarray(patches), max(1, n_patches // 100))
-    logger.info(f"Resolving {n_patches} patches in {len(chunks)} chunks")
+    # the budget is for the whole prompt, so the fixed part of every request
+    # (system prompts and the message prefix) is taken off first
+    overhead = estimate_tokens(
+        STRICT_JSON + system_prompt + _PATCH_SPECS_PREFIX, model
+    )
+    prompt_budget = chunk_token_budget(model)
+    budget = prompt_budget - overhead
+    if budget <= 0:
+        raise ValueError(
+            f"Chunk token budget {prompt_budget} does not cover the "
+            f"{overhead} prompt tokens"
+        )
+    # sized as sent, see the HumanMessage below
+    sizes = [estimate_tokens(json.dumps(p, indent=2), model) for p in patches]
+    chunks = chunk_by_tokens(patches, sizes, budget)
+    chunk_tokens = []
+    offset = 0
     for chunk in chunks:
-        chunk_size = len(chunk)
+        chunk_tokens.append(sum(sizes[offset : offset + len(chunk)]))
+        offset += len(chunk)
+    logger.info(
+        f"Split {n_patches} patches (~{sum(sizes)} tokens, budget {budget}/chunk "
+        f"after {overhead} prompt tokens) into "
+        f"{len(chunks)} chunks: sizes {[len(c) for c in chunks]}, tokens {chunk_tokens}"
+    )
+    rate_limiter = get_rate_limiter()
+
+    def _resolve_chunk(index: int, chunk_patches: List[dict]) -> List[Dict[str, Any]]:
+        chunk_size = len(chunk_patches)
 
         class Response(BaseModel):
             results: List[Dict[str, Any]] = Field(
@@ -367,15 +526,11 @@ Return the result in the following structure:
             @model_validator(mode="after")
             def _validate_response(self):
                 for i, result in enumerate(self.results):
-                    if set(result.keys()) != set(patches[i].keys()):
-                        raise ValueError(
-                            f"Keys mismatch in patch {i}: expected {set(patches[i].keys())}, got {set(result.keys())}"
-                        )
-                    if set(result.keys()) != set(patches[i].keys()):
+                    patch = chunk_patches[i]
+                    if set(result.keys()) != set(patch.keys()):
                         raise ValueError(
-                            f"Keys mismatch in patch {i}: expected {set(patches[i].keys())}, got {set(result.keys())}"
+                            f"Keys mismatch in patch {i}: expected {set(patch.keys())}, got {set(result.keys())}"
                         )
-                    patch = patches[i]
                     for key, spec in patch.items():
                         field_type = spec.get("type")
                         val = result[key]
@@ -408,24 +563,49 @@ Return the result in the following structure:
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(
-                content="Please convert the following patch:\n"
-                + json.dumps(chunk.tolist(), indent=2)
+                content=_PATCH_SPECS_PREFIX + json.dumps(chunk_patches, indent=2)
             ),
         ]
 
-        logger.info(f"Processing chunk with {len(chunk)} patches")
+        logger.info(f"Processing chunk {index} with {chunk_size} patches")
 
-        chunk_results = call_with_self_heal(
-            smart_llm, messages, Response, max_repairs=5
-        ).results
+        attempt = 1
+        while True:
+            try:
+                chunk_results = call_with_self_heal(
+                    smart_llm,
+                    messages,
+                    Response,
+                    max_repairs=5,
+                    rate_limiter=rate_limiter,
+                ).results
+                break
+            except Exception as e:
+                # only this chunk is retried, the others keep their results
+                if attempt >= CHUNK_ATTEMPTS:
+                    raise
+                logger.warning(f"Chunk {index} failed on attempt {attempt}: {e}")
+                attempt += 1
 
         logger.debug(
-            f"Chunk processed:\n```json\n{json.dumps(chunk_results, indent=2)}\n```"
+            f"Chunk {index} processed:\n```json\n{json.dumps(chunk_results, indent=2)}\n```"
         )
+        return chunk_results
 
-        resolved_values.extend(chunk_results)
+    workers = max(1, min(LLM_CONCURRENCY, len(chunks)))
+    logger.info(
+        f"Resolving {n_patches} patches in {len(chunks)} chunks, {workers} at a time"
+    )
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-chunk") as ex:
+        # map keeps the input order
+        chunk_results = list(ex.map(_resolve_chunk, range(len(chunks)), chunks))
 
-    return resolved_values
+    if usage is not None:
+        for name, u in usage.usage_metadata.items():
+            logger.info(
+                f"{name} used {u['input_tokens']} input and {u['output_tokens']} output tokens"
+            )
+    return [r for results in chunk_results for r in results]
 
 
 def _skip_non_updatable_fields(
@@ -465,7 +645,7 @@ def create_patches(
 
     logger.info(f"Creating asset mapping for {asset_type} {operation_name}")
     asset_mapping = _create_asset_mapping(
-        llm, asset_spec, example_input, operation_name
+        llm, asset_spec, example_input, operation_name, asset_type=asset_type
     )
 
     invalid_predicate = ValueError(
@@ -540,17 +720,35 @@ def confirm(prompt="Continue? (y/n): "):
 
 
 def run_tasks_with_port_forwarding(
-    env: Environment, tasks: List[ExecutionTask], dry_run=True
-):
-    handle: PortForwardHandle
+    env: Environment, tasks: List[ExecutionTask], dry_run=True, wait_for_cache=False
+) -> Optional[str]:
+    handle: Optional[PortForwardHandle] = None
     try:
         handle = start_port_forwarding(env)
-        run_tasks(environment=env, tasks=tasks, dry_run=dry_run)
+        return run_tasks(
+            environment=env,
+            tasks=tasks,
+            dry_run=dry_run,
+            port=handle.port,
+            wait_for_cache=wait_for_cache,
+        )
     except Exception as e:
         logger.error(f"Error executing tasks in environment {env}: {e}")
     finally:
         if handle:
             stop_port_forwarding(handle)
+    return None
+
+
+def rollback_with_port_forwarding(run_id: str, dry_run=True) -> None:
+    header, _ = read_snapshot(run_id)
+    handle: Optional[PortForwardHandle] = None
+    try:
+        handle = start_port_forwarding(header.environment)
+        rollback(run_id, dry_run=dry_run, port=handle.port)
+    finally:
+        if handle:
+            stop_port_forwarding(handle)
 
 
 def create_enriched_patches(
@@ -586,34 +784,42 @@ def create_enriched_patches(
         f"Initial patches:\n```json\n{json.dumps([p.model_dump() for p in patches], indent=2)}\n```"
     )
 
+    logger.debug(f"Checking for enricher for {asset_type} {operation_name}...")
+    enricher = get_enricher(key)
+    if enricher is not None and enricher.pure is not None:
+        # environment independent, done once for all environments on a copy
+        # so that the patches built above are left as they are
+        patches = [p.model_copy(deep=True) for p in patches]
+        enricher.pure(patches)
+
     patches_by_env = {}
     for env in environments:
-        patches_by_env[env] = [AssetPatch(**p.model_dump()) for p in patches]
+        patches_by_env[env] = [p.model_copy(deep=True) for p in patches]
         logger.debug(
             f"Patches for {env}:\n```json\n{json.dumps([p.model_dump() for p in patches_by_env[env]], indent=2)}\n```"
         )
 
-    logger.debug(f"Checking for enricher for {asset_type} {operation_name}...")
-    enrich = ENRICHERS.get(key, None)
-    if enrich is not None:
+    if enricher is not None and enricher.env_bound is not None:
+        enrich = enricher.env_bound
         logger.debug(f"Enricher found for {asset_type} {operation_name}, enriching...")
-        for env, ps in patches_by_env.items():
+
+        def _enrich_env(env: Environment) -> None:
+            ps = patches_by_env[env]
             logger.info(
-                f"Enriching {len(patches)} for {asset_type} {operation_name} in env {env}..."
+                f"Enriching {len(ps)} for {asset_type} {operation_name} in env {env}..."
             )
             try:
                 start_port_forward(env)
-                for i, p in enumerate(ps):
-                    enrich(p)
-                    logger.debug(f"Enriched patch {i}")
+                enrich(ps, EnrichmentContext(env=env))
             except Exception as e:
-                logger.error(
-                    f"Error enriching patch {i}\n```json\n{i}\n```\n\n {e}",
-                    exc_info=True,
-                )
+                logger.error(f"Error enriching patches in env {env}: {e}", exc_info=True)
                 raise
             finally:
                 stop_port_forward()
+
+        with ThreadPoolExecutor(max_workers=max(1, len(environments))) as ex:
+            # list() re-raises the first failure
+            list(ex.map(_enrich_env, environments))
     logger.debug(
         f"Enriched patches:\n```json\n{json.dumps({k: [m.model_dump() for m in v] for k, v in patches_by_env.items()}, indent=2)}\n```"
     )
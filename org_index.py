@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app_types import Environment
+from db import MongoKey, default_namespace, get_default_key, mongo
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+ORG_INDEX_TTL = float(os.getenv("ORG_INDEX_TTL", "300"))
+
+_PROJECTION = {"companyId": 1, "attributes.vatCode": 1}
+
+
+class OrgRecord:
+    __slots__ = ("company_id", "vat_code")
+
+    def __init__(self, company_id: str, vat_code: Optional[str]) -> None:
+        self.company_id = company_id
+        self.vat_code = vat_code
+
+    def __repr__(self) -> str:
+        return f"OrgRecord({self.company_id!r}, {self.vat_code!r})"
+
+
+class OrganizationIndex:
+    """
+    In-memory index of cached_Organization by VAT code.
+    """
+
+    def __init__(self, records: Iterable[OrgRecord]) -> None:
+        self._count = 0
+        self._by_vat: Dict[str, OrgRecord] = {}
+        for r in records:
+            self._count += 1
+            if r.vat_code:
+                self._by_vat.setdefault(r.vat_code, r)
+
+    @classmethod
+    def load(cls, key: MongoKey) -> "OrganizationIndex":
+        env, namespace = key
+        start = time.monotonic()
+        docs = (
+            mongo(env, namespace)
+            .db("kering")
+            .collection("cached_Organization")
+            .find_iter({}, _PROJECTION)
+        )
+        index = cls(
+            OrgRecord(d["companyId"], (d.get("attributes") or {}).get("vatCode"))
+            for d in docs
+            if d.get("companyId")
+        )
+        logger.info(
+            f"Loaded {len(index)} organizations of {env}/{namespace} in {time.monotonic() - start:.2f}s"
+        )
+        return index
+
+    def __len__(self) -> int:
+        return self._count
+
+    def by_vat(self, vat_code: str) -> Optional[OrgRecord]:
+        return self._by_vat.get(vat_code)
+
+
+_indexes: Dict[MongoKey, Tuple[OrganizationIndex, float]] = {}
+_indexes_lock = threading.Lock()
+# one load at a time per database, different databases load concurrently
+_load_locks: Dict[MongoKey, threading.Lock] = {}
+
+
+def _key(env: Optional[Environment], namespace: Optional[str]) -> MongoKey:
+    if env is None:
+        key = get_default_key()
+        if key is None:
+            raise RuntimeError("Mongo port-forward is not running.")
+        return key
+    return (env, namespace or default_namespace(env))
+
+
+def organization_index(
+    env: Optional[Environment] = None,
+    namespace: Optional[str] = None,
+    *,
+    refresh: bool = False,
+) -> OrganizationIndex:
+    """
+    Return the organization index of (env, namespace), loading it on first
+    use and again once it is older than ORG_INDEX_TTL. Defaults to the
+    database selected with db.start_port_forward.
+    """
+    key = _key(env, namespace)
+    with _indexes_lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    with load_lock:
+        entry = _indexes.get(key)
+        if (
+            refresh
+            or entry is None
+            or time.monotonic() - entry[1] > ORG_INDEX_TTL
+        ):
+            entry = (OrganizationIndex.load(key), time.monotonic())
+            with _indexes_lock:
+                _indexes[key] = entry
+        return entry[0]
+
+
+def invalidate_organization_index(
+    env: Optional[Environment] = None, namespace: Optional[str] = None
+) -> None:
+    """Drop cached indexes of `env` (all of them when env is None)."""
+    with _indexes_lock:
+        for key in list(_indexes):
+            if env is None or (key[0] == env and namespace in (None, key[1])):
+                del _indexes[key]
+
+
+def find_organizations_by_vat(
+    vat_codes: Iterable[str],
+    env: Optional[Environment] = None,
+    namespace: Optional[str] = None,
+) -> Dict[str, OrgRecord]:
+    """
+    Look up many VAT codes, reloading the index once if some are missing.
+    Raises ValueError listing the codes still not found.
+    """
+    wanted = sorted(set(vat_codes))
+    if not wanted:
+        return {}
+
+    def _lookup(index: OrganizationIndex) -> Tuple[Dict[str, OrgRecord], List[str]]:
+        found = {v: r for v in wanted if (r := index.by_vat(v)) is not None}
+        return found, [v for v in wanted if v not in found]
+
+    found, missing = _lookup(organization_index(env, namespace))
+    if missing:
+        # the organization may have been created since the index was loaded
+        found, missing = _lookup(organization_index(env, namespace, refresh=True))
+    if missing:
+        raise ValueError(f"Organizations with vatCode={missing} not found")
+    return found
@@ -0,0 +1,165 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from app_types import Environment
+from db import MongoKey, get_client, get_connection_manager, mongo
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+PURGE_CONCURRENCY = int(os.getenv("PURGE_CONCURRENCY", "8"))
+
+
+class DbPurgeResult(BaseModel):
+    env: Environment
+    namespace: str
+    db: str
+    deleted: int = 0
+    duration_s: float = 0.0
+    skipped: bool = False
+    error: Optional[str] = None
+
+
+class PurgeReport(BaseModel):
+    collection: str
+    results: List[DbPurgeResult]
+    elapsed_s: float
+
+    @property
+    def deleted(self) -> int:
+        return sum(r.deleted for r in self.results)
+
+    @property
+    def failed(self) -> List[DbPurgeResult]:
+        return [r for r in self.results if r.error is not None]
+
+
+def _delete_chunked(collection: Any, predicate: Dict, chunk_size: int) -> int:
+    """
+    Delete matching documents in ascending _id ranges of at most
+    `chunk_size`, so no single delete holds the collection for long. Each
+    chunk continues after the last _id of the previous one instead of
+    scanning from the start again.
+    """
+    deleted = 0
+    last_id: Any = None
+    while True:
+        after = predicate
+        if last_id is not None:
+            after = {"$and": [predicate, {"_id": {"$gt": last_id}}]}
+        ids = [
+            d["_id"]
+            for d in collection.find_iter(
+                after,
+                {"_id": 1},
+                batch_size=chunk_size,
+                sort=[("_id", 1)],
+                limit=chunk_size,
+            )
+        ]
+        if not ids:
+            return deleted
+        deleted += collection.delete_many(
+            {"$and": [after, {"_id": {"$lte": ids[-1]}}]}
+        )
+        if len(ids) < chunk_size:
+            return deleted
+        last_id = ids[-1]
+
+
+def _purge_db(
+    key: MongoKey,
+    db_name: str,
+    collection_name: str,
+    predicate: Dict,
+    chunk_size: Optional[int],
+) -> DbPurgeResult:
+    env, ns = key
+    result = DbPurgeResult(env=env, namespace=ns, db=db_name)
+    start = time.monotonic()
+    try:
+        # a long chunked delete must not lose its client to the idle sweep
+        with get_connection_manager().hold(env, ns):
+            try:
+                collection = mongo(env, ns).db(db_name).collection(collection_name)
+            except ValueError:
+                result.skipped = True
+                return result
+            if chunk_size:
+                result.deleted = _delete_chunked(collection, predicate, chunk_size)
+            else:
+                result.deleted = collection.delete_many(predicate)
+        logger.info(
+            f"Deleted {result.deleted} {collection_name} documents in {env}/{ns}/{db_name}."
+        )
+    except Exception as e:
+        result.error = str(e)
+        logger.error(
+            f"Failed to delete {collection_name} documents in {env}/{ns}/{db_name}: {e}"
+        )
+    finally:
+        result.duration_s = time.monotonic() - start
+    return result
+
+
+def _list_dbs(key: MongoKey) -> Tuple[MongoKey, List[str], Optional[str]]:
+    try:
+        return key, get_client(*key).list_database_names(), None
+    except Exception as e:
+        logger.error(f"Failed to list databases of {key[0]}/{key[1]}: {e}")
+        return key, [], str(e)
+
+
+def purge_collection(
+    targets: Sequence[MongoKey],
+    collection_name: str,
+    predicate: Optional[Dict] = None,
+    *,
+    chunk_size: Optional[int] = None,
+    max_workers: int = PURGE_CONCURRENCY,
+) -> PurgeReport:
+    """
+    Delete documents matching `predicate` from `collection_name` in every
+    database of every (env, namespace) in `targets`.
+
+    Databases are purged concurrently through the pooled client of their
+    namespace (see db.MongoConnectionManager); databases without the
+    collection are skipped. With `chunk_size` each database is purged in
+    _id ranges of that size instead of with one delete_many.
+    """
+    predicate = predicate or {}
+    start = time.monotonic()
+    results: List[DbPurgeResult] = []
+    workers = max(1, max_workers)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="purge") as ex:
+        jobs = []
+        for key, dbs, error in ex.map(_list_dbs, targets):
+            if error is not None:
+                results.append(
+                    DbPurgeResult(env=key[0], namespace=key[1], db="*", error=error)
+                )
+            jobs.extend((key, db_name) for db_name in dbs)
+        results.extend(
+            ex.map(
+                lambda job: _purge_db(
+                    job[0], job[1], collection_name, predicate, chunk_size
+                ),
+                jobs,
+            )
+        )
+
+    report = PurgeReport(
+        collection=collection_name,
+        results=results,
+        elapsed_s=time.monotonic() - start,
+    )
+    logger.info(
+        f"Purged {report.deleted} {collection_name} documents from {len(jobs)} databases "
+        f"in {report.elapsed_s:.1f}s ({len(report.failed)} failed)"
+    )
+    return report
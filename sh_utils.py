@@ -20,6 +20,15 @@ def run_cmd(
     )
 
 
+def is_port_open(port: int, host: str = "127.0.0.1", timeout: float = 0.5) -> bool:
+    """Return True if something accepts TCP connections on host:port."""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
 def is_port_in_use(port: int) -> bool:
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -28,3 +37,4 @@ def is_port_in_use(port: int) -> bool:
         except OSError:
             return True
     return False
+
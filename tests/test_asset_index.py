@@ -0,0 +1,75 @@
+import pytest
+
+from app_types import AssetSpec
+from bc.asset_index import AssetMatcher, CompositeKeyIndex, get_field
+
+ASSETS = [
+    {"id": "a", "key": "K1", "organizationId": "acme"},
+    {"id": "b", "key": "K1", "organizationId": "other"},
+    {"id": "c", "key": "K2", "organizationId": "acme", "attributes": {"vatCode": "IT1"}},
+    {"id": "d", "key": "K3"},
+]
+
+
+def test_get_field_resolves_dotted_paths_through_nested_objects():
+    assert get_field(ASSETS[2], "attributes.vatCode") == "IT1"
+    assert get_field({"attributes.vatCode": "flat"}, "attributes.vatCode") == "flat"
+
+
+def test_composite_key_lookup():
+    index = CompositeKeyIndex.build(["key", "organizationId"], ASSETS)
+    assert index.get({"key": "K1", "organizationId": "other"})["id"] == "b"
+    assert index.get({"key": "K1", "organizationId": "nobody"}) is None
+    assert len(index) == len(ASSETS)
+
+
+def test_all_matches_in_insertion_order():
+    index = CompositeKeyIndex.build(["key"], ASSETS)
+    assert [a["id"] for a in index.get_all({"key": "K1"})] == ["a", "b"]
+
+
+def test_missing_field_matches_none():
+    # same as the previous linear scan: asset.get(field) == value
+    index = CompositeKeyIndex.build(["key", "organizationId"], ASSETS)
+    assert index.get({"key": "K3", "organizationId": None})["id"] == "d"
+    assert index.get({"key": "K3", "organizationId": "acme"}) is None
+
+
+def test_dict_values_match_regardless_of_key_order():
+    assets = [{"id": "x", "country": {"id": "IT", "code": "Italy"}}]
+    index = CompositeKeyIndex.build(["country"], assets)
+    assert index.get({"country": {"code": "Italy", "id": "IT"}})["id"] == "x"
+
+
+def test_predicate_fields_must_match_index_fields():
+    index = CompositeKeyIndex.build(["key"], ASSETS)
+    with pytest.raises(ValueError):
+        index.get({"id": "a"})
+
+
+def test_index_needs_fields():
+    with pytest.raises(ValueError):
+        CompositeKeyIndex([])
+
+
+def test_matcher_uses_spec_index_and_builds_others_lazily():
+    spec = AssetSpec(fields={"Key": "key"}, predicate_fields=["key"])
+    matcher = AssetMatcher(iter(ASSETS), spec)
+    assert len(matcher) == len(ASSETS)
+    assert matcher.find({"key": "K2"})["id"] == "c"
+    assert matcher.find({"organizationId": "acme", "key": "K1"})["id"] == "a"
+    assert matcher.index_for(["key", "organizationId"]) is matcher.index_for(
+        ["organizationId", "key"]
+    )
+    assert matcher.find({}) is None
+
+
+def test_dotted_predicates_match_nested_fields_not_missing_ones():
+    # a flat asset.get("attributes.vatCode") was None for every asset
+    index = CompositeKeyIndex.build(["attributes.vatCode"], ASSETS)
+    assert index.get({"attributes.vatCode": "IT1"})["id"] == "c"
+    assert [a["id"] for a in index.get_all({"attributes.vatCode": None})] == [
+        "a",
+        "b",
+        "d",
+    ]
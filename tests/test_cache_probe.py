@@ -0,0 +1,120 @@
+import time
+
+from bc.cache_utils import OrgReloadResult, _wait_fresh, sentinel_probe
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find_one(self, predicate, projection=None):
+        for doc in self.docs:
+            if all(doc.get(k) == v for k, v in predicate.items()):
+                return dict(doc)
+        return None
+
+
+class FakeDb:
+    def __init__(self, collections):
+        self.collections = collections
+
+    def list_collection_names(self, filter=None):
+        return [n for n in self.collections if filter is None or n == filter["name"]]
+
+    def __getitem__(self, name):
+        return FakeCollection(self.collections.setdefault(name, []))
+
+
+class FakeClient:
+    """Org databases holding lists of cached documents."""
+
+    def __init__(self, dbs):
+        self.dbs = {name: FakeDb(cols) for name, cols in dbs.items()}
+
+    def list_database_names(self):
+        return list(self.dbs)
+
+    def __getitem__(self, name):
+        return self.dbs[name]
+
+
+def org_cache(*docs):
+    return {"cached_Organization": list(docs)}
+
+
+def cached(client, org):
+    return client[org].collections["cached_Organization"]
+
+
+def test_update_is_fresh_once_the_version_changes():
+    client = FakeClient(
+        {
+            "acme": org_cache({"id": "o1", "updatedAt": "t1"}),
+            "other": org_cache(),
+            "admin": {},
+        }
+    )
+    probe = sentinel_probe(client, "Organization", {"id": "o1"}, "update")
+    assert probe("acme", "") is False
+    cached(client, "acme")[0]["updatedAt"] = "t2"
+    assert probe("acme", "") is True
+    # never held the asset / has no cached collection: not checked
+    assert probe("other", "") is None
+    assert probe("admin", "") is None
+
+
+def test_delete_is_fresh_once_the_asset_is_gone():
+    client = FakeClient({"acme": org_cache({"id": "o1"})})
+    probe = sentinel_probe(client, "Organization", {"id": "o1"}, "delete")
+    assert probe("acme", "") is False
+    cached(client, "acme").clear()
+    assert probe("acme", "") is True
+
+
+def test_create_is_fresh_once_the_asset_is_there():
+    client = FakeClient({"acme": org_cache(), "other": org_cache()})
+    probe = sentinel_probe(client, "Organization", {"id": "o1"}, "create", ["acme"])
+    assert probe("acme", "") is False
+    cached(client, "acme").append({"id": "o1"})
+    assert probe("acme", "") is True
+    assert probe("other", "") is None
+
+
+def test_assets_without_version_fields_are_not_checked():
+    client = FakeClient({"acme": org_cache({"id": "o1"})})
+    for operation in ("create", "update"):
+        probe = sentinel_probe(client, "Organization", {"id": "o1"}, operation)
+        assert probe("acme", "") is None
+
+
+def result():
+    return OrgReloadResult(org="acme", host="h", ok=True, latency_s=0.1)
+
+
+def test_wait_fresh_polls_until_fresh():
+    answers = iter([False, RuntimeError("mongo hiccup"), True])
+
+    def probe(org, host):
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    r = result()
+    _wait_fresh(r, probe, time.monotonic() + 5, 0.01)
+    assert r.fresh is True
+    assert r.fresh_after_s is not None
+
+
+def test_wait_fresh_gives_up_at_the_deadline():
+    r = result()
+    _wait_fresh(r, lambda org, host: False, time.monotonic() + 0.05, 0.01)
+    assert r.fresh is False
+
+
+def test_wait_fresh_returns_at_once_when_not_checked():
+    calls = []
+    r = result()
+    _wait_fresh(r, lambda org, host: calls.append(org), time.monotonic() + 5, 0.01)
+    assert r.fresh is None
+    assert calls == ["acme"]
@@ -0,0 +1,114 @@
+import pytest
+
+from converters import UNRESOLVED, convert_patch_specs, convert_spec_value
+
+
+def spec(type_, value, name="field", **extra):
+    return {"name": name, "type": type_, "value": value, **extra}
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("Yes", True), ("no", False), ("TRUE", True), ("0", False), ("Active", True)],
+)
+def test_boolean_words(value, expected):
+    assert convert_spec_value(spec("boolean", value)) is expected
+
+
+@pytest.mark.parametrize(
+    "name, value, expected",
+    [
+        ("disabled", "Not Active", True),
+        ("disabled", "Active", False),
+        ("notAvailable", "Available", False),
+        ("is_not_visible", "Hidden", True),
+        ("visible", "Hidden", False),
+    ],
+)
+def test_state_words_are_inverted_for_negated_fields(name, value, expected):
+    assert convert_spec_value(spec("boolean", value, name=name)) is expected
+
+
+def test_unknown_boolean_word_is_unresolved():
+    assert convert_spec_value(spec("boolean", "Maybe")) is UNRESOLVED
+
+
+@pytest.mark.parametrize(
+    "value, expected", [("12", 12), (" 1 000 ", 1000), ("1.5", 1.5), (2.5, 2.5), (3, 3)]
+)
+def test_numbers(value, expected):
+    assert convert_spec_value(spec("number", value)) == expected
+
+
+@pytest.mark.parametrize("value", ["inf", "-Infinity", "nan", float("inf"), True, "12a"])
+def test_non_finite_and_invalid_numbers_are_unresolved(value):
+    assert convert_spec_value(spec("number", value)) is UNRESOLVED
+
+
+@pytest.mark.parametrize("value", [None, "", "None", "null", "nan", float("nan")])
+def test_explicit_empties_are_null_for_nullable_fields(value):
+    assert convert_spec_value(spec("string", value, nullable=True)) is None
+
+
+@pytest.mark.parametrize("value", ["NA", "n/a", "-"])
+def test_placeholders_are_not_guessed_as_null(value):
+    assert convert_spec_value(spec("string", value, nullable=True)) == value
+    assert convert_spec_value(spec("number", value, nullable=True)) is UNRESOLVED
+
+
+def test_null_of_non_nullable_fields():
+    assert convert_spec_value(spec("array", "", array_value_type="LibraryEntry")) == []
+    assert convert_spec_value(spec("string", "None")) == "None"
+    assert convert_spec_value(spec("boolean", None)) is UNRESOLVED
+
+
+def test_library_entries():
+    assert convert_spec_value(spec("LibraryEntry", " IT ")) == {"id": "IT"}
+    entry = {"id": "IT", "code": "Italy"}
+    assert convert_spec_value(spec("LibraryEntry", entry)) == entry
+
+
+def test_arrays_of_library_entries():
+    value = "Component/Raw Material Supplier"
+    assert convert_spec_value(spec("array", value, array_value_type="LibraryEntry")) == [
+        {"id": value}
+    ]
+    assert convert_spec_value(
+        spec("array", ["a", "b"], array_value_type="LibraryEntry")
+    ) == [{"id": "a"}, {"id": "b"}]
+
+
+def test_lists_packed_in_one_cell_are_unresolved():
+    value = spec("array", "Frame Manufacturer, Eyewear Designer", array_value_type="LibraryEntry")
+    assert convert_spec_value(value) is UNRESOLVED
+
+
+def test_relations_get_the_predicate_field_value():
+    relation = {"asset_type": "Organization", "predicate_field": "vatCode"}
+    converted = convert_spec_value(spec("string", "IT1", name="manufacturerId", relation=relation))
+    assert converted["relation"] == {**relation, "predicate_field_value": "IT1"}
+    assert "value" not in converted
+
+
+def test_references_to_other_assets_are_unresolved():
+    assert convert_spec_value(spec("Organization", "acme")) is UNRESOLVED
+
+
+def test_convert_patch_specs_reports_unresolved_fields():
+    patches = [
+        {
+            "semiFinishedSupplier": spec("boolean", "Yes"),
+            "types": spec("array", "Frame Manufacturer", array_value_type="LibraryEntry"),
+            "catalogUploadedBy": spec("string", "None", nullable=True),
+        },
+        {"semiFinishedSupplier": spec("boolean", "Perhaps")},
+    ]
+    results, unresolved = convert_patch_specs(patches)
+    assert results[0] == {
+        "semiFinishedSupplier": True,
+        "types": [{"id": "Frame Manufacturer"}],
+        "catalogUploadedBy": None,
+    }
+    assert unresolved == [(1, "semiFinishedSupplier")]
+    # unresolved fields keep their spec object for the model
+    assert results[1]["semiFinishedSupplier"] == patches[1]["semiFinishedSupplier"]
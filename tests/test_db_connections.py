@@ -0,0 +1,74 @@
+from unittest import mock
+
+import pytest
+
+import db
+from db import MongoConnectionManager, _MongoConnection
+
+
+class FakeLease:
+    port = 27017
+
+    def __init__(self):
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture
+def manager():
+    manager = MongoConnectionManager(health_check_interval=3600, idle_ttl=0)
+
+    def connect(key):
+        return _MongoConnection(
+            key=key, lease=FakeLease(), client=mock.MagicMock(), port=27017
+        )
+
+    with mock.patch.object(manager, "_connect", side_effect=connect):
+        yield manager
+    manager.close_all()
+
+
+def test_idle_connections_are_closed(manager):
+    client = manager.client("dev")
+    manager.close_idle()
+    client.close.assert_called_once()
+    assert manager.client("dev") is not client
+
+
+def test_held_connections_survive_the_idle_sweep(manager):
+    with manager.hold("dev") as client:
+        manager.close_idle()
+        client.close.assert_not_called()
+        assert manager.client("dev") is client
+    manager.close_idle()
+    client.close.assert_called_once()
+
+
+def test_facade_is_dropped_with_its_client(manager):
+    with mock.patch.object(db, "_manager", manager):
+        facade = db.mongo("dev")
+        client = facade.client
+        assert id(client) in db._facades
+        manager.close_idle()
+        assert id(client) not in db._facades
+        assert db.mongo("dev") is not facade
+
+
+def test_collection_wrappers_expire_with_the_names():
+    names = ["cached_Organization", "notifications"]
+    database = mock.MagicMock()
+    database.name = "kering"
+    database.list_collection_names.side_effect = lambda: list(names)
+    facade = db.Db(database, names_ttl=0)
+
+    wrapper = facade.collection("Organization")
+    assert facade.collection("cached_Organization") is wrapper
+
+    names.remove("cached_Organization")
+    with pytest.raises(ValueError):
+        facade.collection("Organization")
+
+    names.append("cached_Organization")
+    assert facade.collection("Organization") is not wrapper
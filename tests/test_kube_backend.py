@@ -0,0 +1,59 @@
+from unittest import mock
+
+import pytest
+
+from bc import kube_api, kube_utils
+from bc.kube_utils import KubeError
+
+
+@pytest.fixture
+def api_client():
+    # stands in for the optional kubernetes package
+    with mock.patch.object(kube_api, "k8s_client", mock.MagicMock()):
+        yield
+
+
+def backend(value):
+    return mock.patch.object(kube_api, "KUBE_BACKEND", value)
+
+
+def test_unknown_backend_is_rejected():
+    with backend("kubeapi"), pytest.raises(ValueError):
+        kube_api.is_enabled()
+
+
+def test_api_backend_needs_the_client():
+    with backend("api"), mock.patch.object(kube_api, "k8s_client", None):
+        with pytest.raises(RuntimeError):
+            kube_api.is_enabled()
+
+
+def test_auto_backend_uses_the_client_when_installed(api_client):
+    with backend("auto"):
+        assert kube_api.is_enabled()
+    with backend("kubectl"):
+        assert not kube_api.is_enabled()
+
+
+@pytest.fixture
+def failing_api(api_client):
+    with mock.patch.object(
+        kube_utils, "prepare_context", return_value="ctx"
+    ), mock.patch.object(
+        kube_api, "list_pod_names", side_effect=RuntimeError("forbidden")
+    ), mock.patch.object(
+        kube_utils, "_run_kubectl", return_value="NAME READY\npod-1 1/1\n"
+    ) as kubectl:
+        yield kubectl
+
+
+def test_auto_backend_falls_back_to_kubectl(failing_api):
+    with backend("auto"):
+        assert kube_utils.list_pod_names("dev", "ns") == ["pod-1"]
+    failing_api.assert_called_once()
+
+
+def test_api_backend_raises_api_failures(failing_api):
+    with backend("api"), pytest.raises(KubeError, match="forbidden"):
+        kube_utils.list_pod_names("dev", "ns")
+    failing_api.assert_not_called()
@@ -0,0 +1,59 @@
+import math
+
+import pytest
+
+from llm_utils import chunk_by_tokens, chunk_token_budget
+
+
+def chunk_sizes(chunks, sizes):
+    out, offset = [], 0
+    for chunk in chunks:
+        out.append(sum(sizes[offset : offset + len(chunk)]))
+        offset += len(chunk)
+    return out
+
+
+def test_empty_input():
+    assert chunk_by_tokens([], [], 100) == []
+
+
+def test_everything_fits_in_one_chunk():
+    assert chunk_by_tokens(["a", "b", "c"], [10, 20, 30], 100) == [["a", "b", "c"]]
+
+
+@pytest.mark.parametrize(
+    "sizes, budget",
+    [
+        ([10] * 25, 100),
+        ([30, 70, 10, 90, 40, 40, 20, 60], 100),
+        ([1, 99, 1, 99, 1, 99], 100),
+        (list(range(1, 60)), 250),
+    ],
+)
+def test_chunks_stay_within_budget_and_keep_order(sizes, budget):
+    items = list(range(len(sizes)))
+    chunks = chunk_by_tokens(items, sizes, budget)
+    assert [i for chunk in chunks for i in chunk] == items
+    assert all(chunks)
+    assert max(chunk_sizes(chunks, sizes)) <= budget
+
+
+def test_uniform_items_use_the_fewest_balanced_chunks():
+    sizes = [10] * 25
+    chunks = chunk_by_tokens(list(range(25)), sizes, 100)
+    assert len(chunks) == math.ceil(sum(sizes) / 100)
+    tokens = chunk_sizes(chunks, sizes)
+    # no small trailing chunk
+    assert max(tokens) - min(tokens) <= 10
+
+
+def test_oversized_item_gets_its_own_chunk():
+    chunks = chunk_by_tokens(["a", "big", "b"], [10, 500, 10], 100)
+    assert chunks == [["a"], ["big"], ["b"]]
+
+
+def test_budget_override(monkeypatch):
+    monkeypatch.setenv("LLM_CHUNK_TOKEN_BUDGET", "1234")
+    assert chunk_token_budget("gpt-4o") == 1234
+    monkeypatch.delenv("LLM_CHUNK_TOKEN_BUDGET")
+    assert chunk_token_budget("gpt-4o") == 6000
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+
+from bc import log_store
+from bc.kube_logs import LogLine
+from bc.log_store import LogStore, _merge, _missing, _ts
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def at(minutes_ago: float) -> datetime:
+    return NOW - timedelta(minutes=minutes_ago)
+
+
+def line(ts: datetime, text: str, level: str = "INFO") -> LogLine:
+    return LogLine(timestamp=ts, text=text, level=level, namespace="ns", pod="pod")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LogStore(tmp_path / "logs.sqlite3")
+    yield store
+    store.close()
+
+
+def fetch(store, lines, since, until=None):
+    with mock.patch.object(log_store, "stream_logs", return_value=iter(lines)) as m:
+        store.fetch(
+            "dev",
+            "ns",
+            "pod",
+            since_time=since.isoformat(),
+            until_time=None if until is None else until.isoformat(),
+        )
+    return m
+
+
+def texts(lines):
+    return [x.text for x in lines]
+
+
+def test_missing():
+    segments = [("b", "d"), ("f", "g")]
+    assert _missing([], "a", "z") == [("a", "z")]
+    assert _missing(segments, "a", "z") == [("a", "b"), ("d", "f"), ("g", "z")]
+    assert _missing(segments, "b", "c") == []
+    assert _missing(segments, "c", "e") == [("d", "e")]
+
+
+def test_merge():
+    assert _merge([("f", "g"), ("a", "c"), ("b", "d")]) == [("a", "d"), ("f", "g")]
+    assert _merge([("a", "b"), ("b", "c")]) == [("a", "c")]
+
+
+def test_repeated_lines_are_kept_and_redownloads_ignored(store):
+    ts = at(30)
+    lines = [line(ts, "retry"), line(ts, "retry"), line(at(29), "ok")]
+    fetch(store, lines, at(40), at(20))
+    # the same window again is served from the store
+    assert fetch(store, lines, at(40), at(20)).call_count == 0
+    # an overlapping window only downloads the rest, the overlap is deduplicated
+    fetch(store, lines + [line(at(15), "later")], at(40), at(10))
+    assert texts(store.query("dev", "ns", "pod")) == ["retry", "retry", "ok", "later"]
+
+
+def test_recent_window_is_downloaded_again(store):
+    fetch(store, [line(at(5), "old")], at(10))
+    m = fetch(store, [line(at(5), "old"), line(at(0.1), "late")], at(10))
+    # only the unsettled tail is asked for again
+    since = m.call_args.kwargs["since_time"]
+    assert since >= _ts(at(1.5))
+    assert texts(store.query("dev", "ns", "pod")) == ["old", "late"]
+
+
+def test_text_search(store):
+    fetch(
+        store,
+        [line(at(3), "connection-refused by db"), line(at(2), "error: timeout")],
+        at(10),
+        at(1),
+    )
+    assert texts(store.query("dev", "ns", text="connection-refused")) == [
+        "connection-refused by db"
+    ]
+    assert texts(store.query("dev", "ns", text="error:")) == ["error: timeout"]
+    assert len(list(store.query("dev", "ns", text="timeout OR refused"))) == 2
+
+
+def test_prune_by_age_and_size(tmp_path):
+    store = LogStore(tmp_path / "logs.sqlite3", retention_days=1, max_lines=2)
+    old = NOW - timedelta(days=2)
+    fetch(store, [line(old, "ancient")], old - timedelta(minutes=1), old)
+    fetch(store, [line(at(30), "a"), line(at(20), "b"), line(at(10), "c")], at(40), at(5))
+    store.prune()
+    assert texts(store.query("dev", "ns", "pod")) == ["b", "c"]
+    # the pruned period is downloaded again when asked for
+    m = fetch(store, [], at(40), at(5))
+    assert m.call_args.kwargs["since_time"] == _ts(at(40))
+    store.close()
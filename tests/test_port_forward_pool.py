@@ -0,0 +1,69 @@
+from unittest import mock
+
+import pytest
+
+from bc.kube_utils import PortForwardError, PortForwardPool
+
+
+class FakeProcess:
+    def __init__(self):
+        self.stopped = False
+
+    def poll(self):
+        return 0 if self.stopped else None
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = PortForwardPool()
+    ports = iter(range(40000, 41000))
+
+    def start(forward):
+        forward.process = FakeProcess()
+        forward.local_port = forward.requested_port or forward.local_port or next(ports)
+
+    def stop(forward):
+        forward.process.stopped = True
+
+    with mock.patch.object(pool, "_start", side_effect=start), mock.patch.object(
+        pool, "_stop", side_effect=stop
+    ), mock.patch.object(pool, "_start_reaper"):
+        yield pool
+
+
+def acquire(pool, tmp_path, **kwargs):
+    return pool.acquire(
+        "dev", "ns", "bcrest", remote_port=8080, log_file=str(tmp_path / "pf.log"), **kwargs
+    )
+
+
+def test_close_waits_for_outstanding_leases(pool, tmp_path):
+    first = acquire(pool, tmp_path)
+    second = acquire(pool, tmp_path)
+    process = first.process
+
+    first.release()
+    pool.close(first.key)
+    assert not process.stopped
+    second.ensure_alive()
+    assert second.process is process
+
+    second.release()
+    assert process.stopped
+    # the next lease starts a fresh, tracked forward
+    third = acquire(pool, tmp_path)
+    assert third.process is not process
+
+
+def test_close_without_leases_stops_right_away(pool, tmp_path):
+    lease = acquire(pool, tmp_path)
+    lease.release()
+    pool.close(lease.key)
+    assert lease.process.stopped
+
+
+def test_requested_port_must_match_the_pooled_forward(pool, tmp_path):
+    lease = acquire(pool, tmp_path)
+    assert acquire(pool, tmp_path, local_port=lease.port).port == lease.port
+    with pytest.raises(PortForwardError):
+        acquire(pool, tmp_path, local_port=lease.port + 1)
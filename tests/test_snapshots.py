@@ -0,0 +1,162 @@
+import gzip
+from unittest import mock
+
+import pytest
+
+import operation_helpers  # noqa: F401  (imports bc.run_tasks without the import cycle)
+from app_types import AssetPatch, ExecutionTask
+from bc import run_tasks
+from bc.snapshots import SnapshotWriter, read_snapshot, snapshot_path
+
+
+class FakeApi:
+    """In-memory BlockchainApi keyed by asset type and id."""
+
+    base_url = "http://localhost:3000"
+
+    def __init__(self, assets):
+        self.assets = {t: {a["id"]: dict(a) for a in items} for t, items in assets.items()}
+        self.listed = []
+
+    def iter_all(self, type_, fields=None):
+        self.listed.append(type_)
+        return iter([dict(a) for a in self.assets.get(type_, {}).values()])
+
+    def find_existing(self, type_, ids):
+        stored = self.assets.get(type_, {})
+        return {i: dict(stored[i]) for i in ids if i in stored}
+
+    def save_batch(self, type_, batch):
+        for asset in batch:
+            self.assets.setdefault(type_, {})[asset["id"]] = dict(asset)
+
+    def delete_batch(self, type_, ids):
+        for id_ in ids:
+            self.assets.get(type_, {}).pop(id_, None)
+
+
+@pytest.fixture
+def api():
+    api = FakeApi(
+        {
+            "Organization": [
+                {"id": "o1", "name": "Acme"},
+                {"id": "o2", "name": "Other"},
+            ]
+        }
+    )
+    with mock.patch.object(run_tasks, "BlockchainApi", return_value=api), mock.patch.object(
+        run_tasks, "_refresh_cache"
+    ), mock.patch.object(run_tasks, "id_mapper", return_value="id"):
+        yield api
+
+
+def task(operation, *patches):
+    return ExecutionTask(
+        asset_type="Organization",
+        operation=operation,
+        patches=[AssetPatch(predicate=p, patch=q) for p, q in patches],
+    )
+
+
+def test_snapshot_round_trip_keeps_the_earliest_image(tmp_path):
+    with SnapshotWriter("run1", "dev", tmp_path) as writer:
+        writer.record("Organization", "o1", {"id": "o1", "name": "first"})
+        writer.record("Organization", "o2", None)
+        writer.record("Organization", "o1", {"id": "o1", "name": "second"})
+    header, images = read_snapshot("run1", tmp_path)
+    assert (header.run_id, header.environment) == ("run1", "dev")
+    assert {i.asset_id: i.before for i in images} == {
+        "o1": {"id": "o1", "name": "first"},
+        "o2": None,
+    }
+
+
+def test_truncated_snapshot_uses_the_flushed_part(tmp_path):
+    writer = SnapshotWriter("run2", "dev", tmp_path)
+    writer.record("Organization", "o1", {"id": "o1"})
+    writer.close()
+    path = snapshot_path("run2", tmp_path)
+    data = path.read_bytes()
+    path.write_bytes(data[:-8])  # drop the gzip trailer, as after a crash
+    with gzip.open(path, "rt") as f:
+        assert f.readline()
+    _, images = read_snapshot("run2", tmp_path)
+    assert [i.asset_id for i in images] == ["o1"]
+
+
+def test_missing_snapshot():
+    with pytest.raises(RuntimeError):
+        read_snapshot("nope")
+
+
+def test_run_and_rollback_restore_the_previous_state(api, tmp_path):
+    before = {t: {i: dict(a) for i, a in items.items()} for t, items in api.assets.items()}
+    run_id = run_tasks.run_tasks(
+        environment="dev",
+        tasks=[
+            task("update", ({"name": "Acme"}, {"name": "Acme Corp"})),
+            task("update", ({"id": "o1"}, {"name": "Acme Inc"})),
+            task("delete", ({"name": "Other"}, {})),
+            task("create", ({}, {"id": "o3", "name": "New"}), ({}, {"id": "o1", "name": "Upsert"})),
+        ],
+        dry_run=False,
+        snapshots_dir=tmp_path,
+        port=3000,
+    )
+    assert set(api.assets["Organization"]) == {"o1", "o3"}
+    # creates look up their ids only, the type is listed for updates/deletes
+    assert api.listed.count("Organization") == 3
+
+    run_tasks.rollback(run_id, dry_run=False, snapshots_dir=tmp_path, port=3000)
+    assert api.assets == before
+
+
+def test_dry_run_keeps_creates_without_id(api, tmp_path):
+    with mock.patch.object(api, "save_batch") as save:
+        run_tasks.run_tasks(
+            environment="dev",
+            tasks=[task("create", ({}, {"name": "No id"}))],
+            dry_run=True,
+            snapshots_dir=tmp_path,
+            port=3000,
+        )
+    save.assert_called_once_with("Organization", [{"name": "No id"}])
+    assert not list(tmp_path.iterdir())
+
+
+def test_creates_without_id_are_skipped_when_snapshotting(api, tmp_path):
+    run_tasks.run_tasks(
+        environment="dev",
+        tasks=[task("create", ({}, {"name": "No id"}))],
+        dry_run=False,
+        snapshots_dir=tmp_path,
+        port=3000,
+    )
+    assert [a["name"] for a in api.assets["Organization"].values()] == ["Acme", "Other"]
+
+
+def test_cache_probe_is_built_before_the_writes(api, tmp_path):
+    events = []
+    manager = mock.MagicMock()
+    save_batch = api.save_batch
+
+    def save(*args):
+        events.append("write")
+        save_batch(*args)
+
+    with mock.patch.object(api, "save_batch", side_effect=save), mock.patch.object(
+        run_tasks, "get_connection_manager", return_value=manager
+    ), mock.patch.object(
+        run_tasks, "sentinel_probe", side_effect=lambda *a: events.append("probe")
+    ):
+        run_tasks.run_tasks(
+            environment="dev",
+            tasks=[task("update", ({"id": "o1"}, {"name": "Acme Inc"}))],
+            dry_run=False,
+            snapshots_dir=tmp_path,
+            port=3000,
+            wait_for_cache=True,
+        )
+    assert events == ["probe", "write"]
+    manager.hold.assert_called_once_with("dev")